@@ -0,0 +1,139 @@
+""" Time to turn page bodies (the bytes of API responses) into typed columns:
+ - row by row: json.loads, then per-cell Python coercion into dicts,
+ - decode only: json_codec (orjson if installed), the floor for anything that
+   starts from decoded pages,
+ - dicts: json_codec, then RecordBatchBuilder (what yield_record_batches does),
+ - arrow json: Arrow's json reader on the page bytes, straight into record batches
+   without Python objects per record.
+
+If pandas is installed, every variant ends with a DataFrame (pandas.DataFrame of the rows,
+or Table.to_pandas of the batches), which is what the analysts actually want.
+
+No Zoho connection is needed: the synthetic Contacts of bench_compact_records are used.
+Needs pyarrow.
+
+    python benchmarks/bench_arrow_batches.py [n_records]
+"""
+
+import gc
+import json
+import sys
+import time
+from datetime import date, datetime
+
+import pyarrow as pa
+import pyarrow.json as pa_json
+
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+from bench_compact_records import FIELDS, _json_page
+from zoho_crm_connector.codec import default_codec
+from zoho_crm_connector.columnar import RecordBatchBuilder
+
+PAGE_SIZE = 200
+
+
+def _row_by_row(pages):
+    """ What the analysts do today: coerce each cell, then build rows."""
+    rows = []
+    for page in pages:
+        for r in page:
+            rows.append({
+                "id": r["id"],
+                "First_Name": r.get("First_Name"),
+                "Last_Name": r.get("Last_Name"),
+                "Email": r.get("Email"),
+                "Lead_Source": r.get("Lead_Source"),
+                "Owner_id": r["Owner"]["id"],
+                "Owner_name": r["Owner"]["name"],
+                "Created_By_id": r["Created_By"]["id"],
+                "Created_By_name": r["Created_By"]["name"],
+                "Account_Name_id": r["Account_Name"]["id"],
+                "Account_Name_name": r["Account_Name"]["name"],
+                "Date_of_Birth": date.fromisoformat(r["Date_of_Birth"]),
+                "Created_Time": datetime.fromisoformat(r["Created_Time"]),
+                "Modified_Time": datetime.fromisoformat(r["Modified_Time"]),
+                "Email_Opt_Out": bool(r["Email_Opt_Out"]),
+                "Annual_Spend": float(r["Annual_Spend"]),
+            })
+    return rows
+
+
+def _row_by_row_from_bodies(bodies):
+    rows = _row_by_row(json.loads(body)["data"] for body in bodies)
+    return rows if pd is None else pd.DataFrame(rows)
+
+
+def _decode_only(bodies):
+    codec = default_codec()
+    return [codec.loads(body)["data"] for body in bodies]
+
+
+def _to_dataframe(batches):
+    return batches if pd is None else pa.Table.from_batches(batches).to_pandas()
+
+
+def _dicts(bodies):
+    codec = default_codec()
+    builder = RecordBatchBuilder(FIELDS)
+    return _to_dataframe(
+        [builder.build(codec.loads(body)["data"]) for body in bodies])
+
+
+def _arrow_json(bodies):
+    builder = RecordBatchBuilder(FIELDS)
+    parse_options = pa_json.ParseOptions(
+        explicit_schema=pa.schema([("data", pa.list_(builder.raw_type))]),
+        unexpected_field_behavior="ignore")
+    batches = []
+    for body in bodies:
+        read_options = pa_json.ReadOptions(use_threads=False,
+                                           block_size=len(body) + 1)
+        pages = pa_json.read_json(pa.BufferReader(body), read_options,
+                                  parse_options)
+        records = pages.column("data").chunk(0).flatten()
+        batches.append(builder.from_struct(records))
+    return _to_dataframe(batches)
+
+
+def _best_of(function, bodies, repeat=5):
+    """ The best of repeat runs, without the garbage collector."""
+    best = float("inf")
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function(bodies)
+            best = min(best, time.perf_counter() - start)
+    finally:
+        gc.enable()
+    return best
+
+
+def main(n_records: int = 200000):
+    records = json.loads(_json_page(n_records))
+    bodies = [
+        json.dumps({
+            "data": records[i:i + PAGE_SIZE],
+            "info": {"per_page": PAGE_SIZE, "more_records": True},
+        }).encode() for i in range(0, n_records, PAGE_SIZE)
+    ]
+    del records
+
+    print(f"records:     {n_records}"
+          f"{'' if pd is None else ', as DataFrames'}")
+    row_seconds = _best_of(_row_by_row_from_bodies, bodies)
+    for name, function in (("row by row", None), ("decode only", _decode_only),
+                           ("dicts", _dicts), ("arrow json", _arrow_json)):
+        seconds = row_seconds if function is None else _best_of(
+            function, bodies)
+        print(f"{name + ':':<13}{seconds:8.3f} s "
+              f"({n_records / seconds:>9,.0f} records/s, "
+              f"{row_seconds / seconds:.2f}x)")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:]))
@@ -0,0 +1,92 @@
+""" Memory used by a module held as dicts (as returned by yield_page_from_module)
+compared with compact records (zoho_crm_connector.records).
+
+No Zoho connection is needed: synthetic Contacts are generated.
+
+    python benchmarks/bench_compact_records.py [n_records]
+"""
+
+import gc
+import json
+import random
+import sys
+import tracemalloc
+
+from zoho_crm_connector.records import make_record_type
+
+FIELDS = [
+    {"api_name": "First_Name", "data_type": "text"},
+    {"api_name": "Last_Name", "data_type": "text"},
+    {"api_name": "Email", "data_type": "email"},
+    {"api_name": "Lead_Source", "data_type": "picklist"},
+    {"api_name": "Owner", "data_type": "ownerlookup"},
+    {"api_name": "Created_By", "data_type": "ownerlookup"},
+    {"api_name": "Account_Name", "data_type": "lookup"},
+    {"api_name": "Date_of_Birth", "data_type": "date"},
+    {"api_name": "Created_Time", "data_type": "datetime"},
+    {"api_name": "Modified_Time", "data_type": "datetime"},
+    {"api_name": "Email_Opt_Out", "data_type": "boolean"},
+    {"api_name": "Annual_Spend", "data_type": "currency"},
+]
+
+OWNERS = [{"name": f"Sales Person {i}", "id": str(3000000000000 + i)}
+          for i in range(20)]
+SOURCES = ["Advertisement", "Cold Call", "Web Download", "Trade Show"]
+
+
+def _json_page(n_records: int) -> str:
+    """ The records go through json text so that strings are not shared,
+    as is the case for real API responses."""
+    rnd = random.Random(1)
+    records = []
+    for i in range(n_records):
+        account = rnd.randrange(n_records // 10 + 1)
+        records.append({
+            "id": str(4000000000000 + i),
+            "First_Name": f"First{i}",
+            "Last_Name": f"Last{i}",
+            "Email": f"person{i}@example.com",
+            "Lead_Source": rnd.choice(SOURCES),
+            "Owner": rnd.choice(OWNERS),
+            "Created_By": rnd.choice(OWNERS),
+            "Account_Name": {"name": f"Account {account}",
+                             "id": str(5000000000000 + account)},
+            "Date_of_Birth": "1980-05-17",
+            "Created_Time": "2019-05-01T10:00:00+10:00",
+            "Modified_Time": "2019-06-01T10:00:00+10:00",
+            "Email_Opt_Out": False,
+            "Annual_Spend": 1234.5,
+        })
+    return json.dumps(records)
+
+
+def _measure(build):
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current
+
+
+def main(n_records: int = 200000):
+    text = _json_page(n_records)
+    Contact = make_record_type("Contacts", FIELDS)
+
+    dicts, dict_bytes = _measure(lambda: json.loads(text))
+    del dicts
+    compact, compact_bytes = _measure(
+        lambda: [Contact.from_dict(r) for r in json.loads(text)])
+    del compact
+
+    print(f"records: {n_records}")
+    print(f"dicts:   {dict_bytes / 2**20:8.1f} MiB "
+          f"({dict_bytes / n_records:.0f} bytes/record)")
+    print(f"compact: {compact_bytes / 2**20:8.1f} MiB "
+          f"({compact_bytes / n_records:.0f} bytes/record)")
+    print(f"ratio:   {dict_bytes / compact_bytes:8.2f}x")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:]))
@@ -0,0 +1,101 @@
+""" Throughput of json decoding and encoding: requests' own r.json() and json= encoding
+(before) compared with the codecs of zoho_crm_connector.codec (after),
+and the size of a page on the wire with gzip.
+
+No Zoho connection is needed: synthetic pages of 200 Deals are used.
+
+    python benchmarks/bench_json_codec.py [n_pages]
+"""
+
+import gc
+import gzip
+import json
+import sys
+import time
+
+import requests
+from requests.models import complexjson
+
+from zoho_crm_connector.codec import JsonCodec, OrjsonCodec
+
+
+def _page(page_number: int) -> bytes:
+    records = [{
+        "id": str(4000000000000 + page_number * 200 + i),
+        "Deal_Name": f"Deal {page_number}-{i}",
+        "Stage": "Qualification",
+        "Amount": 1000.0 + i,
+        "Closing_Date": "2019-06-30",
+        "Owner": {"name": "Tim Richardson", "id": "3000000000001"},
+        "Account_Name": {"name": f"Account {i}", "id": str(5000000000000 + i)},
+        "Description": "A longer free text description of the deal. " * 4,
+        "Created_Time": "2019-05-01T10:00:00+10:00",
+        "Modified_Time": "2019-06-01T10:00:00+10:00",
+        "$approved": True,
+        "Tag": [],
+    } for i in range(200)]
+    return json.dumps({
+        "data": records,
+        "info": {"per_page": 200, "count": 200, "page": page_number,
+                 "more_records": True}
+    }).encode()
+
+
+def _response(content: bytes) -> requests.Response:
+    r = requests.Response()
+    r.status_code = 200
+    r._content = content  # pylint: disable=protected-access
+    return r
+
+
+def _throughput(n_bytes: int, function, repeat: int = 5) -> float:
+    """ MiB/s of the best of repeat runs, without the garbage collector."""
+    best = float("inf")
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            best = min(best, time.perf_counter() - start)
+    finally:
+        gc.enable()
+    return n_bytes / best / 2**20
+
+
+def main(n_pages: int = 50):
+    pages = [_page(n) for n in range(n_pages)]
+    n_bytes = sum(len(p) for p in pages)
+    decoded = [json.loads(p) for p in pages]
+    codecs = [JsonCodec()]
+    try:
+        codecs.append(OrjsonCodec())
+    except ImportError:
+        print("orjson is not installed")
+
+    print(f"{n_pages} pages, {n_bytes / 2**20:.1f} MiB of json")
+    print("decode MiB/s")
+    responses = [_response(p) for p in pages]
+    print(f"  requests r.json(): "
+          f"{_throughput(n_bytes, lambda: [r.json() for r in responses]):8.1f}")
+    for codec in codecs:
+        print(f"  {codec.name + ':':18} "
+              f"{_throughput(n_bytes, lambda: [codec.loads(p) for p in pages]):8.1f}")
+
+    print("encode MiB/s")
+    # what requests does with json=
+    print(f"  requests json=:    " + "{:8.1f}".format(
+        _throughput(
+            n_bytes, lambda: [
+                complexjson.dumps(d, allow_nan=False).encode("utf-8")
+                for d in decoded
+            ])))
+    for codec in codecs:
+        print(f"  {codec.name + ':':18} "
+              f"{_throughput(n_bytes, lambda: [codec.dumps(d) for d in decoded]):8.1f}")
+
+    compressed = sum(len(gzip.compress(p, 6)) for p in pages)
+    print(f"gzip: {n_bytes / compressed:.1f}x smaller on the wire")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:]))
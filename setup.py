@@ -13,9 +13,13 @@ setup(
         keywords=keywords,
         version=version,
         packages=['zoho_crm_connector'],
-        python_requires='>=3.6',
+        python_requires='>=3.7',
         install_requires=['requests',
             ],
+        extras_require={
+            'fast': ['orjson'],
+            'arrow': ['pyarrow>=14', 'orjson'],
+            },
         setup_requires=["pytest-runner",],
         tests_require=["pytest",],
         classifiers=[
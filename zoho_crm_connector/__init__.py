@@ -1 +1,12 @@
-from .zoho_crm_api import ZohoCRM
+from .zoho_crm_api import ZohoCRM, DeadlineExceeded
+from .checkpoint import Checkpoint
+from .records import CompactRecord, Lookup, make_record_type, yield_compact_pages
+from .join import HashIndex, Join, hash_join, join_modules
+from .search import AnyOf, criteria_strings, search_module
+from .writer import BufferedWriter
+from .notifications import (ChangeEvent, NotificationChannels,
+                            NotificationReceiver, yield_changed_records)
+from .token_store import FileTokenStore, SharedTokenStore
+from .manager import RateLimiter, ZohoCRMManager
+from .export import export_module, yield_exported_pages
+from .cassette import CassetteMiss, recording_session, replay_session
@@ -0,0 +1,294 @@
+"""
+zoho_crm_connector.cassette
+~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Record real HTTP exchanges to a cassette file and replay them, without the live API.
+
+A RecordingAdapter wraps the transport of a requests session and appends each exchange
+to a Cassette: a gzip-compressed json lines file. Secrets are scrubbed before anything is
+written: no request headers are kept (so no Authorization header), refresh_token,
+client_id, client_secret and access_token are replaced in urls, request bodies and
+json responses, and so is an OAuth grant code in urls and form bodies
+(a code in json is Zoho's status code, such as SUCCESS, and is kept).
+
+A ReplayAdapter answers requests from a cassette, matched on method, url (with scrubbed
+and sorted query parameters) and request body. Identical requests get the recorded answers
+in the order they were recorded (the last one repeats). Answers come back immediately,
+or after the recorded latency times latency_scale:
+
+    zoho_crm = ZohoCRM(..., requests_session=recording_session(Path('contacts.jsonl.gz')))
+    ...
+    zoho_crm = ZohoCRM(..., requests_session=replay_session(Path('contacts.jsonl.gz')))
+
+recording() and replaying() do the same for every requests session in the process,
+including the ones a script makes itself (see zoho_crm_connector.profiling).
+"""
+
+import base64
+import gzip
+import hashlib
+import json
+import threading
+import time
+import urllib.parse
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Deque, Dict, Iterator, Optional, Tuple
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from .zoho_crm_api import _requests_retry_session
+
+SCRUBBED = "SCRUBBED"
+SECRET_KEYS = frozenset(
+    ("refresh_token", "client_id", "client_secret", "access_token"))
+# query strings and form bodies also carry the grant code of the OAuth token exchange
+SECRET_PARAMETERS = SECRET_KEYS | {"code"}
+# the response headers worth keeping: the rest are noise, or set cookies
+KEPT_HEADERS = ("content-type", "content-encoding", "content-length",
+                "retry-after")
+
+
+class CassetteMiss(RuntimeError):
+    """ A request which is not on the cassette."""
+
+
+def _scrub_json(value):
+    """ The json value with the values of SECRET_KEYS replaced, at any depth."""
+    if isinstance(value, dict):
+        return {
+            k: SCRUBBED if k in SECRET_KEYS else _scrub_json(v)
+            for k, v in value.items()
+        }
+    if isinstance(value, list):
+        return [_scrub_json(v) for v in value]
+    return value
+
+
+def _scrub_query(query: str) -> str:
+    pairs = urllib.parse.parse_qsl(query, keep_blank_values=True)
+    return urllib.parse.urlencode(
+        sorted((k, SCRUBBED if k in SECRET_PARAMETERS else v) for k, v in pairs))
+
+
+def scrub_url(url: str) -> str:
+    """ The url with secret query parameters scrubbed and the parameters sorted,
+            so that the same request always has the same url."""
+    parts = urllib.parse.urlsplit(url)
+    return urllib.parse.urlunsplit(parts._replace(query=_scrub_query(parts.query)))
+
+
+def _request_body(request: requests.PreparedRequest) -> bytes:
+    body = request.body or b""
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    if request.headers.get("Content-Encoding") == "gzip":
+        body = gzip.decompress(body)
+    return body
+
+
+def request_key(request: requests.PreparedRequest) -> Tuple[str, str, str]:
+    """ (method, scrubbed url, digest of the scrubbed body) of a request.
+            A json body is compared by value, so the json codec doesn't matter."""
+    body = _request_body(request)
+    if body:
+        try:
+            body = json.dumps(_scrub_json(json.loads(body)),
+                              sort_keys=True).encode("utf-8")
+        except ValueError:
+            body = _scrub_query(body.decode("utf-8", "replace")).encode("utf-8")
+    digest = hashlib.sha1(body).hexdigest() if body else ""
+    return request.method, scrub_url(request.url), digest
+
+
+def _response_body(response: requests.Response) -> dict:
+    """ The response body for the cassette: text (json with secrets scrubbed), or base64."""
+    content = response.content or b""
+    try:
+        text = content.decode("utf-8")
+    except UnicodeDecodeError:
+        return {"body_b64": base64.b64encode(content).decode("ascii")}
+    try:
+        decoded = json.loads(text)
+    except ValueError:
+        return {"body": text}
+    scrubbed = _scrub_json(decoded)
+    if scrubbed != decoded:
+        text = json.dumps(scrubbed, separators=(",", ":"))
+    return {"body": text}
+
+
+class Cassette:
+    """ Exchanges in a gzip-compressed json lines file, one exchange per line."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._file = None
+        self._started = False
+
+    def append(self, exchange: dict):
+        line = json.dumps(exchange, separators=(",", ":")) + "\n"
+        with self._lock:
+            if self._file is None:
+                # a new recording replaces the file; after a close it is appended to
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._file = gzip.open(str(self.path),
+                                       "at" if self._started else "wt",
+                                       encoding="utf-8")
+                self._started = True
+            self._file.write(line)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __iter__(self) -> Iterator[dict]:
+        with gzip.open(str(self.path), "rt", encoding="utf-8") as cassette_file:
+            for line in cassette_file:
+                yield json.loads(line)
+
+
+class RecordingAdapter(BaseAdapter):
+    """ Sends requests with `adapter` and records every exchange to the cassette."""
+
+    def __init__(self, adapter: BaseAdapter, cassette: Cassette):
+        super().__init__()
+        self.adapter = adapter
+        self.cassette = cassette
+
+    def send(self, request, **kwargs):  # pylint: disable=arguments-differ
+        start = time.perf_counter()
+        response = self.adapter.send(request, **kwargs)
+        response.content  # pylint: disable=pointless-statement
+        seconds = time.perf_counter() - start
+        method, url, digest = request_key(request)
+        exchange = {
+            "method": method,
+            "url": url,
+            "body_digest": digest,
+            "status": response.status_code,
+            "reason": response.reason,
+            "headers": {
+                k: v
+                for k, v in response.headers.items()
+                if k.lower() in KEPT_HEADERS
+            },
+            "seconds": round(seconds, 6),
+        }
+        exchange.update(_response_body(response))
+        self.cassette.append(exchange)
+        return response
+
+    def close(self):
+        self.adapter.close()
+        self.cassette.close()
+
+
+class ReplayAdapter(BaseAdapter):
+    """ Answers requests with the responses recorded on a cassette.
+            Each answer takes the recorded latency times latency_scale (0: no waiting)."""
+
+    def __init__(self, cassette: Cassette, latency_scale: float = 0.0):
+        super().__init__()
+        self.latency_scale = latency_scale
+        self._lock = threading.Lock()
+        self._answers = defaultdict(deque)  # type: Dict[Tuple, Deque[dict]]
+        for exchange in cassette:
+            self._answers[(exchange["method"], exchange["url"],
+                           exchange["body_digest"])].append(exchange)
+
+    def _answer(self, request) -> Optional[dict]:
+        with self._lock:
+            answers = self._answers.get(request_key(request))
+            if not answers:
+                return None
+            return answers.popleft() if len(answers) > 1 else answers[0]
+
+    def send(self, request, **kwargs):  # pylint: disable=arguments-differ
+        exchange = self._answer(request)
+        if exchange is None:
+            raise CassetteMiss(
+                f"No recorded answer for {request.method} {scrub_url(request.url)}")
+        if self.latency_scale:
+            time.sleep(exchange["seconds"] * self.latency_scale)
+        response = requests.Response()
+        response.status_code = exchange["status"]
+        response.reason = exchange["reason"]
+        response.headers = CaseInsensitiveDict(exchange["headers"])
+        response.encoding = get_encoding_from_headers(response.headers)
+        if "body_b64" in exchange:
+            response._content = base64.b64decode(exchange["body_b64"])  # pylint: disable=protected-access
+        else:
+            response._content = exchange["body"].encode("utf-8")  # pylint: disable=protected-access
+        response._content_consumed = True  # pylint: disable=protected-access
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        return response
+
+    def close(self):
+        pass
+
+
+def recording_session(path: Path,
+                      session: requests.Session = None) -> requests.Session:
+    """ A session (by default with ZohoCRM's retry policy) which records to the cassette at path."""
+    session = session or _requests_retry_session()
+    cassette = Cassette(path)
+    for prefix in ("https://", "http://"):
+        session.mount(prefix, RecordingAdapter(session.get_adapter(prefix),
+                                               cassette))
+    return session
+
+
+def replay_session(path: Path, latency_scale: float = 0.0) -> requests.Session:
+    """ A session which answers from the cassette at path."""
+    session = requests.Session()
+    adapter = ReplayAdapter(Cassette(path), latency_scale)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+@contextmanager
+def recording(path: Path):
+    """ Record the exchanges of every requests session in the process to the cassette at path."""
+    cassette = Cassette(path)
+    wrapped = {}  # type: Dict[int, RecordingAdapter]
+    lock = threading.Lock()
+    get_adapter = requests.Session.get_adapter
+
+    def recording_adapter(session, url):
+        adapter = get_adapter(session, url)
+        if isinstance(adapter, RecordingAdapter):
+            return adapter
+        with lock:
+            if id(adapter) not in wrapped:
+                wrapped[id(adapter)] = RecordingAdapter(adapter, cassette)
+            return wrapped[id(adapter)]
+
+    requests.Session.get_adapter = recording_adapter
+    try:
+        yield cassette
+    finally:
+        requests.Session.get_adapter = get_adapter
+        cassette.close()
+
+
+@contextmanager
+def replaying(path: Path, latency_scale: float = 0.0):
+    """ Answer the requests of every requests session in the process from the cassette at path."""
+    adapter = ReplayAdapter(Cassette(path), latency_scale)
+    get_adapter = requests.Session.get_adapter
+    requests.Session.get_adapter = lambda session, url: adapter
+    try:
+        yield adapter
+    finally:
+        requests.Session.get_adapter = get_adapter
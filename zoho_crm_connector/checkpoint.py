@@ -0,0 +1,136 @@
+"""
+zoho_crm_connector.checkpoint
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Durable checkpoints, so that a long pagination can be resumed after a failure.
+
+Pass a Checkpoint to ZohoCRM.yield_page_from_module or yield_deleted_records_from_module.
+After each page has been processed (that is, when the generator is asked for the next page)
+the next page number (or page token) is written to the checkpoint file.
+A job restarted with the same checkpoint file continues from there:
+
+    checkpoint = Checkpoint(Path('contacts_export.checkpoint.json'))
+    for page in zoho_crm.yield_page_from_module('Contacts', checkpoint=checkpoint):
+        write(page)
+    checkpoint.remove()
+
+The checkpoint also records the module, criteria, parameters and modified_since of the run;
+resuming with different arguments raises ValueError rather than mixing two exports.
+Once the last page has been processed the checkpoint is marked done,
+and a resumed run yields nothing.
+"""
+
+import json
+import os
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+
+class Checkpoint:
+    """ The progress of one pagination, persisted atomically to a json file."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._reset()
+        if self.path.exists():
+            self._load()
+
+    def _reset(self):
+        self.module_name = None  # type: Optional[str]
+        self.kind = None  # type: Optional[str]
+        self.criteria = None  # type: Optional[str]
+        self.parameters = {}  # type: dict
+        self.modified_since = None  # type: Optional[str]
+        self.page = 1
+        self.page_token = None  # type: Optional[str]
+        self.done = False
+
+    def _load(self):
+        with self.path.open() as checkpoint_file:
+            state = json.load(checkpoint_file)
+        self.module_name = state["module_name"]
+        self.kind = state["kind"]
+        self.criteria = state.get("criteria")
+        self.parameters = state.get("parameters") or {}
+        self.modified_since = state.get("modified_since")
+        self.page = state.get("page", 1)
+        self.page_token = state.get("page_token")
+        self.done = state.get("done", False)
+
+    def as_dict(self) -> dict:
+        return {
+            "module_name": self.module_name,
+            "kind": self.kind,
+            "criteria": self.criteria,
+            "parameters": self.parameters,
+            "modified_since": self.modified_since,
+            "page": self.page,
+            "page_token": self.page_token,
+            "done": self.done,
+        }
+
+    @property
+    def started(self) -> bool:
+        return self.module_name is not None
+
+    def bind(self,
+             module_name: str,
+             kind: str,
+             criteria: str = None,
+             parameters: dict = None,
+             modified_since: datetime = None):
+        """ Called by the pagination: records the arguments of a new run,
+                or checks that a resumed run has the same arguments."""
+        state = {
+            "module_name": module_name,
+            "kind": kind,
+            "criteria": criteria,
+            "parameters": {
+                k: v
+                for k, v in (parameters or {}).items()
+                if k not in ("page", "page_token")
+            },
+            "modified_since":
+                modified_since.isoformat() if modified_since else None,
+        }
+        if not self.started:
+            for k, v in state.items():
+                setattr(self, k, v)
+            self.save()
+            return
+        saved = {k: getattr(self, k) for k in state}
+        # round trip through json so that tuples compare equal to the saved lists
+        if json.loads(json.dumps(state)) != saved:
+            raise ValueError(
+                f"Checkpoint {self.path} belongs to a different run: {saved}")
+
+    def advance(self, page: int, page_token: str = None, done: bool = False):
+        """ Record that every page before `page` has been processed."""
+        self.page = page
+        self.page_token = page_token
+        self.done = done
+        self.save()
+
+    def save(self):
+        """ Write the checkpoint atomically: a reader (or a crash)
+                sees either the previous or the new file, never a partial one."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(
+            prefix=self.path.name, suffix=".tmp", dir=str(self.path.parent))
+        try:
+            with os.fdopen(fd, "w") as tmp_file:
+                json.dump(self.as_dict(), tmp_file)
+                tmp_file.flush()
+                os.fsync(tmp_file.fileno())
+            os.replace(tmp_name, str(self.path))
+        except BaseException:
+            os.remove(tmp_name)
+            raise
+
+    def remove(self):
+        """ Delete the checkpoint file, so the next run starts from page 1."""
+        if self.path.exists():
+            self.path.unlink()
+        self._reset()
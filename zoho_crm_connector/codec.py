@@ -0,0 +1,94 @@
+"""
+zoho_crm_connector.codec
+~~~~~~~~~~~~~~~~~~~~~~~~
+
+Pluggable json encoding and decoding for ZohoCRM, and transfer statistics.
+
+On large exports and imports, json work is a noticeable share of CPU.
+ZohoCRM encodes request bodies and decodes responses with a codec:
+orjson (pip install zoho_crm_connector[fast]) when it is installed, otherwise the
+standard library. Any object with dumps(obj) -> bytes and loads(bytes) can be passed
+as ZohoCRM(json_codec=...).
+
+TransferStats counts how many responses arrived compressed and how many bytes
+crossed the wire compared with the decoded size (see ZohoCRM.transfer_stats).
+"""
+
+import json
+import threading
+import time
+
+
+class JsonCodec:
+    """ The standard library json module."""
+    name = "json"
+
+    def dumps(self, obj) -> bytes:
+        return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+    def loads(self, data: bytes):
+        return json.loads(data)
+
+
+class OrjsonCodec(JsonCodec):
+    """ orjson, a json library written in Rust; several times faster than json."""
+    name = "orjson"
+
+    def __init__(self):
+        import orjson  # pylint: disable=import-outside-toplevel
+        self._orjson = orjson
+
+    def dumps(self, obj) -> bytes:
+        return self._orjson.dumps(obj)
+
+    def loads(self, data: bytes):
+        return self._orjson.loads(data)
+
+
+def default_codec() -> JsonCodec:
+    """ orjson if it is installed, otherwise the standard library."""
+    try:
+        return OrjsonCodec()
+    except ImportError:
+        return JsonCodec()
+
+
+class TransferStats:
+    """ Counters of the json responses decoded by a ZohoCRM, safe to share between threads.
+            Responses without a Content-Length header are counted at their decoded size in wire_bytes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.responses = 0
+        self.compressed_responses = 0
+        self.wire_bytes = 0
+        self.body_bytes = 0
+        self.decode_seconds = 0.0
+
+    def record(self, content_encoding: str, content_length: str,
+               body_bytes: int, decode_seconds: float):
+        with self._lock:
+            self.responses += 1
+            if content_encoding and content_encoding != "identity":
+                self.compressed_responses += 1
+            self.wire_bytes += (int(content_length)
+                                if content_length is not None else body_bytes)
+            self.body_bytes += body_bytes
+            self.decode_seconds += decode_seconds
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "responses": self.responses,
+                "compressed_responses": self.compressed_responses,
+                "wire_bytes": self.wire_bytes,
+                "body_bytes": self.body_bytes,
+                "decode_seconds": self.decode_seconds,
+            }
+
+
+def timed_loads(codec: JsonCodec, data: bytes):
+    """ Decode data, returning (the decoded object, seconds taken)."""
+    start = time.perf_counter()
+    decoded = codec.loads(data)
+    return decoded, time.perf_counter() - start
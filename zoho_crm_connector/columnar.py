@@ -0,0 +1,365 @@
+"""
+zoho_crm_connector.columnar
+~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Columnar (Apache Arrow) batches built directly from module pages,
+for analysis with pandas, polars, duckdb and so on.
+
+Converting yield_page_from_module output to a DataFrame row by row, with per-cell type
+coercion, is slow for large modules. Here each page becomes one pyarrow.RecordBatch:
+Arrow converts the page's records in one call, and parses dates and datetimes in bulk.
+Most of the remaining time is json decoding, which orjson (installed with the arrow extra)
+does about as fast as Arrow's own json reader (see benchmarks/bench_arrow_batches.py).
+
+Column types come from the module's field metadata (ZohoCRM.get_module_fields),
+or are inferred from the first page: ISO dates and datetimes are recognised,
+other strings stay strings (digits are often ids or phone numbers, not numbers).
+Lookup fields become two columns, <field>_id and <field>_name.
+An inferred schema is widened by later pages which don't fit it (an integer column
+with fractions becomes double, a column with no values yet takes the type of its first
+values, new fields are added); values which contradict it raise an error.
+
+pyarrow is an optional dependency: pip install zoho_crm_connector[arrow]
+
+    table = read_table(zoho_crm, 'Deals')
+    df = table.to_pandas()
+
+    for batch in yield_record_batches(zoho_crm, 'Contacts', modified_since=since):
+        ...
+"""
+
+import json
+from typing import Dict, Generator, List, Optional, Tuple
+
+from .records import LOOKUP_TYPES
+from .zoho_crm_api import ZohoCRM
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:  # pragma: no cover
+    pa = None
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError(
+            "zoho_crm_connector.columnar needs pyarrow: "
+            "pip install zoho_crm_connector[arrow]")
+
+
+def _arrow_type(data_type: str):
+    """ The Arrow type of a Zoho field data_type (strings for anything else)."""
+    return {
+        "integer": pa.int64(),
+        "bigint": pa.int64(),
+        "double": pa.float64(),
+        "currency": pa.float64(),
+        "decimal": pa.float64(),
+        "percent": pa.float64(),
+        "boolean": pa.bool_(),
+        "date": pa.date32(),
+        "datetime": pa.timestamp("s", tz="UTC"),
+        "multiselectpicklist": pa.list_(pa.string()),
+    }.get(data_type, pa.string())
+
+
+# a column: (source field, part of a lookup or None, Arrow column name, Arrow type)
+_Column = Tuple[str, Optional[str], str, "pa.DataType"]
+
+
+def _columns_from_fields(fields: List[dict]) -> List[_Column]:
+    columns = [("id", None, "id", pa.string())]
+    for field in fields:
+        api_name = field["api_name"]
+        if api_name == "id":
+            continue
+        if field.get("data_type") in LOOKUP_TYPES:
+            columns.append((api_name, "id", f"{api_name}_id", pa.string()))
+            columns.append((api_name, "name", f"{api_name}_name", pa.string()))
+        else:
+            columns.append((api_name, None, api_name,
+                            _arrow_type(field.get("data_type"))))
+    return columns
+
+
+def _temporal_type(strings: "pa.Array"):
+    """ date32 if every string is an ISO date, a UTC timestamp if every string is
+            an ISO datetime with an offset (as Zoho sends them), otherwise None."""
+    strings = strings.drop_null()
+    if len(strings) == 0:
+        return None
+    for arrow_type in (pa.date32(), pa.timestamp("s", tz="UTC")):
+        try:
+            strings.cast(arrow_type)
+            return arrow_type
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            pass
+    return None
+
+
+def _columns_from_page(page: List[dict]) -> List[_Column]:
+    """ Infer the columns from a page: lookups are recognised by their {name, id} value,
+            ISO dates and datetimes by a trial cast; other types (such as the structs
+            of $approval) are what Arrow infers, and null if a column has no values yet."""
+    names = {}  # type: Dict[str, None], ordered
+    for record in page:
+        for name in record:
+            names[name] = None
+    columns = []
+    for name in names:
+        values = [record.get(name) for record in page]
+        if any(isinstance(v, dict) and "id" in v for v in values):
+            columns.append((name, "id", f"{name}_id", pa.string()))
+            columns.append((name, "name", f"{name}_name", pa.string()))
+            continue
+        try:
+            array = pa.array(values)
+            inferred = array.type
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            array, inferred = None, pa.string()
+        if array is not None and pa.types.is_string(inferred):
+            inferred = _temporal_type(array) or inferred
+        columns.append((name, None, name, inferred))
+    return columns
+
+
+def _is_empty(columns: List[_Column]) -> bool:
+    return len(columns) == 1 and pa.types.is_null(columns[0][3])
+
+
+def _widen_field(known: List[_Column], found: List[_Column]) -> List[_Column]:
+    """ The columns of one field which hold both the known values and those found on a page."""
+    if _is_empty(found) or known == found:
+        return known
+    if _is_empty(known):
+        return found
+    known_lookup, found_lookup = known[0][1] is not None, found[0][1] is not None
+    if known_lookup and found_lookup:
+        return known
+    source, _, name, known_type = known[0]
+    found_type = found[0][3]
+    if not (known_lookup or found_lookup):
+        if pa.types.is_string(known_type) and not pa.types.is_nested(found_type):
+            return known  # any scalar can be written as text
+        try:
+            widened = pa.unify_schemas(
+                [pa.schema([(name, known_type)]),
+                 pa.schema([(name, found_type)])],
+                promote_options="permissive").field(name).type
+            return [(source, None, name, widened)]
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            pass
+    raise RuntimeError(
+        f"The values of {source} don't fit its inferred type: "
+        f"{'lookup' if known_lookup else known_type} before, "
+        f"{'lookup' if found_lookup else found_type} now. "
+        "Type the columns with field metadata instead.")
+
+
+def _widen(known: List[_Column], found: List[_Column]) -> List[_Column]:
+    """ The known columns widened to hold a page with the found columns, and new fields added."""
+    by_source = {}  # type: Dict[str, List[_Column]], ordered
+    for column in known:
+        by_source.setdefault(column[0], []).append(column)
+    found_by_source = {}  # type: Dict[str, List[_Column]]
+    for column in found:
+        found_by_source.setdefault(column[0], []).append(column)
+    for source, columns in found_by_source.items():
+        by_source[source] = (_widen_field(by_source[source], columns)
+                             if source in by_source else columns)
+    return [column for columns in by_source.values() for column in columns]
+
+
+def _text(value) -> Optional[str]:
+    """ A value as a string: lists and dicts (such as subforms) as json, not as Python reprs."""
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+
+def _to_array(values: list, arrow_type):
+    """ Build a typed array, letting Arrow parse strings (numbers, dates, datetimes with offsets)
+            when the values are not already of the target type."""
+    try:
+        if pa.types.is_integer(arrow_type):
+            # pa.array would truncate floats; a cast fails instead
+            return pa.array(values).cast(arrow_type)
+        return pa.array(values, type=arrow_type)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        pass
+    if pa.types.is_list(arrow_type):
+        return pa.array([
+            None if v is None else
+            [_text(item) for item in v] if isinstance(v, list) else [_text(v)]
+            for v in values
+        ], type=arrow_type)
+    strings = pa.array([_text(v) for v in values], type=pa.string())
+    if pa.types.is_string(arrow_type):
+        return strings
+    if pa.types.is_boolean(arrow_type):
+        return pc.equal(pc.utf8_lower(strings), "true")
+    return strings.cast(arrow_type)
+
+
+def _raw_type(columns: List[_Column]):
+    """ The struct type the json records are read as by Arrow: lookups as {id, name} structs,
+            dates and datetimes as strings (cast afterwards), everything else as its column type."""
+    raw = {}  # type: Dict[str, pa.DataType], ordered
+    for source, part, _, arrow_type in columns:
+        if part is not None:
+            raw[source] = pa.struct([("id", pa.string()), ("name", pa.string())])
+        elif pa.types.is_temporal(arrow_type):
+            raw[source] = pa.string()
+        else:
+            raw[source] = arrow_type
+    return pa.struct(list(raw.items()))
+
+
+class RecordBatchBuilder:
+    """ Turns pages of records (decoded json) into pyarrow RecordBatches.
+            A page is converted by Arrow in one go; if its values don't fit the raw types
+            (numbers sent as strings, say), the columns are converted one by one.
+            With fields, every batch has their schema. Otherwise the schema is inferred
+            from the first page and widened by later pages as needed, so later batches
+            can have more columns, or wider types, than earlier ones (see conform)."""
+
+    def __init__(self, fields: List[dict] = None):
+        _require_pyarrow()
+        self._inferred = not fields
+        self._columns = None  # type: List[_Column]
+        self._sources = frozenset()
+        self._integer_sources = []  # type: List[str]
+        self.raw_type = None
+        self.schema = None  # type: Optional[pa.Schema]
+        if fields:
+            self._set_columns(_columns_from_fields(fields))
+
+    def _set_columns(self, columns: List[_Column]):
+        self._columns = columns
+        self._sources = frozenset(source for source, _, _, _ in columns)
+        self._integer_sources = [
+            source for source, part, _, arrow_type in columns
+            if part is None and pa.types.is_integer(arrow_type)
+        ]
+        self.schema = pa.schema([(name, t) for _, _, name, t in columns])
+        self.raw_type = _raw_type(columns)
+
+    def infer(self, page: List[dict]):
+        """ Fix the columns from page if they are not known yet;
+                add the fields page has which an inferred schema doesn't."""
+        if self.schema is None:
+            self._set_columns(_columns_from_page(page))
+        elif self._inferred and any(
+                name not in self._sources for record in page for name in record):
+            self._widen(page)
+
+    def _widen(self, page: List[dict]) -> bool:
+        """ Widen the inferred columns to fit page; False if they fit already."""
+        columns = _widen(self._columns, _columns_from_page(page))
+        if columns == self._columns:
+            return False
+        self._set_columns(columns)
+        return True
+
+    def build(self, page: List[dict]) -> "pa.RecordBatch":
+        self.infer(page)
+        # Arrow would truncate a float read as an integer
+        if not any(
+                isinstance(record.get(source), float)
+                for source in self._integer_sources for record in page):
+            try:
+                return self.from_struct(pa.array(page, type=self.raw_type))
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                pass
+        if self._inferred and self._widen(page):
+            return self.build(page)
+        return self._build_columns(page)
+
+    def from_struct(self, records: "pa.StructArray") -> "pa.RecordBatch":
+        """ The batch of records read as raw_type."""
+        raw = dict(zip(self.raw_type.names, records.flatten()))
+        lookups = {}
+        arrays = []
+        for source, part, _, arrow_type in self._columns:
+            if part is None:
+                array = raw[source]
+            else:
+                if source not in lookups:
+                    lookups[source] = dict(zip(("id", "name"),
+                                               raw[source].flatten()))
+                array = lookups[source][part]
+            arrays.append(array if array.type == arrow_type else
+                          array.cast(arrow_type))
+        return pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+
+    def _build_columns(self, page: List[dict]) -> "pa.RecordBatch":
+        arrays = []
+        for source, part, _, arrow_type in self._columns:
+            if part is None:
+                values = [record.get(source) for record in page]
+            else:
+                values = [
+                    lookup.get(part) if isinstance(lookup, dict) else None
+                    for lookup in (record.get(source) for record in page)
+                ]
+            arrays.append(_to_array(values, arrow_type))
+        return pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+
+    def conform(self, batch: "pa.RecordBatch") -> "pa.RecordBatch":
+        """ An earlier batch with the current (widened) schema: columns cast to their
+                wider types, and null columns for the fields it didn't have."""
+        if batch.schema == self.schema:
+            return batch
+        names = set(batch.schema.names)
+        return pa.RecordBatch.from_arrays([
+            batch.column(field.name).cast(field.type) if field.name in names
+            else pa.nulls(batch.num_rows, field.type) for field in self.schema
+        ], schema=self.schema)
+
+
+def _yield_batches(zoho_crm: ZohoCRM, module_name: str,
+                   builder: RecordBatchBuilder,
+                   **kwargs) -> Generator["pa.RecordBatch", None, None]:
+    for page in zoho_crm.yield_page_from_module(
+            module_name=module_name, **kwargs):
+        yield builder.build(page)
+
+
+def _builder(zoho_crm: ZohoCRM, module_name: str, fields: List[dict],
+             use_field_metadata: bool) -> RecordBatchBuilder:
+    _require_pyarrow()
+    if fields is None and use_field_metadata:
+        fields = zoho_crm.get_module_fields(module_name)
+    return RecordBatchBuilder(fields)
+
+
+def yield_record_batches(
+        zoho_crm: ZohoCRM,
+        module_name: str,
+        fields: List[dict] = None,
+        use_field_metadata: bool = True,
+        **kwargs,
+) -> Generator["pa.RecordBatch", None, None]:
+    """ Yields one RecordBatch per page of ZohoCRM.yield_page_from_module (kwargs are passed on).
+            Columns are typed from fields, or the module's field metadata
+            when use_field_metadata is True, otherwise inferred from the first page
+            (and widened by later pages: a batch can have a wider schema than the ones before)."""
+    builder = _builder(zoho_crm, module_name, fields, use_field_metadata)
+    yield from _yield_batches(zoho_crm, module_name, builder, **kwargs)
+
+
+def read_table(zoho_crm: ZohoCRM,
+               module_name: str,
+               fields: List[dict] = None,
+               use_field_metadata: bool = True,
+               **kwargs) -> "pa.Table":
+    """ The whole module (or the records matching kwargs) as one pyarrow Table,
+            with the columns of yield_record_batches."""
+    builder = _builder(zoho_crm, module_name, fields, use_field_metadata)
+    batches = list(_yield_batches(zoho_crm, module_name, builder, **kwargs))
+    if not batches:
+        return pa.table({})
+    return pa.Table.from_batches([builder.conform(b) for b in batches])
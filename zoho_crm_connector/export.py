@@ -0,0 +1,258 @@
+"""
+zoho_crm_connector.export
+~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Full exports of large modules, sharded across processes.
+
+One yield_page_from_module walk is sequential, and a search can only page through
+the first MAX_DEPTH (2,000) records it matches. export_module splits a module into
+disjoint Created_Time (or Modified_Time) ranges, each small enough for one search to read
+to the end, and reads the ranges on a process pool, each into its own json lines file.
+yield_exported_pages merges the files into one stream of pages without duplicates.
+
+The ranges are sized adaptively: from initial_partitions equal ranges between the oldest
+record and now, each range which still has records after the depth limit is halved,
+until every range fits. A one second range can't be halved: if it still doesn't fit,
+only its first MAX_DEPTH records are exported, and it is listed in ExportResult.incomplete.
+
+Every process makes its own ZohoCRM by calling client_factory, which must be picklable
+(a module level function, or a functools.partial of ZohoCRM):
+
+    client_factory = functools.partial(ZohoCRM, refresh_token=refresh_token, client_id=client_id,
+                                       client_secret=client_secret, token_file_dir=Path('tokens'))
+    result = export_module(client_factory, 'Contacts', Path('export/contacts'), max_workers=8)
+    for page in yield_exported_pages(result.paths):
+        ...
+
+Partitioning by Created_Time is stable: a record stays in its range while the export runs.
+With Modified_Time, a record edited during the export moves to a range which may already
+have been read; such records are read once more at the end (modified since the export started),
+and that copy wins when the files are merged.
+
+Ranges of ids are not offered: the search API has no range operators for the id field.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable, Generator, Iterable, List, NamedTuple, Optional
+
+from .codec import default_codec
+from .search import PER_PAGE
+from .zoho_crm_api import LOGGER, ZohoCRM
+
+MAX_DEPTH = 2000  # the records a search can page through
+PARTITION_FIELDS = ("Created_Time", "Modified_Time")
+
+
+class Partition(NamedTuple):
+    """ The records with start <= field < end (no upper bound when end is None).
+            complete is False if a search can't read all of them (see plan_partitions)."""
+    start: datetime
+    end: Optional[datetime]
+    complete: bool = True
+
+    def criteria(self, field: str) -> str:
+        start = f"({field}:greater_equal:{self.start.isoformat(timespec='seconds')})"
+        if self.end is None:
+            return start
+        end = f"({field}:less_than:{self.end.isoformat(timespec='seconds')})"
+        return f"({start}and{end})"
+
+    def halves(self, now: datetime) -> Optional[List["Partition"]]:
+        """ The two halves of the range (an open range is split before now),
+                or None if it is too short to split at a resolution of seconds."""
+        end = self.end or now
+        middle = self.start + timedelta(
+            seconds=int((end - self.start).total_seconds()) // 2)
+        if middle <= self.start:
+            return None
+        return [Partition(self.start, middle), Partition(middle, self.end)]
+
+
+class ExportResult(NamedTuple):
+    """ The files written by export_module, in the order they should be merged,
+            the partitions they hold, and the number of records written (with duplicates).
+            incomplete are the partitions of which only MAX_DEPTH records were exported."""
+    paths: List[Path]
+    partitions: List[Partition]
+    records: int
+    incomplete: List[Partition]
+
+
+def _oldest(zoho_crm: ZohoCRM, module_name: str,
+            field: str) -> Optional[datetime]:
+    data, _ = zoho_crm.get_module_page(
+        module_name,
+        parameters={"sort_by": field, "sort_order": "asc", "per_page": 1})
+    if not data:
+        return None
+    return datetime.fromisoformat(data[0][field]).replace(microsecond=0)
+
+
+def _fits(zoho_crm: ZohoCRM, module_name: str, criteria: str,
+          max_depth: int) -> bool:
+    """ Whether a search can page through all its records: it ends on the first page,
+            or the last page within reach says there are no more records."""
+    per_page = {"per_page": PER_PAGE}
+    _, info = zoho_crm.get_module_page(
+        module_name, criteria=criteria, parameters=per_page)
+    if not info.get("more_records"):
+        return True
+    _, info = zoho_crm.get_module_page(
+        module_name,
+        page=max_depth // PER_PAGE,
+        criteria=criteria,
+        parameters=per_page)
+    return not info.get("more_records")
+
+
+def plan_partitions(
+        zoho_crm: ZohoCRM,
+        module_name: str,
+        field: str = "Created_Time",
+        initial_partitions: int = 8,
+        now: datetime = None,
+        max_depth: int = MAX_DEPTH,
+        probe_workers: int = 4,
+) -> List[Partition]:
+    """ Disjoint ranges of field covering the whole module, each of which
+            a search can read to the end. Ranges are probed concurrently
+            (two calls each at most) and halved until they fit.
+            A one second range which doesn't fit is returned with complete=False."""
+    if field not in PARTITION_FIELDS:
+        raise ValueError(f"field must be one of {PARTITION_FIELDS}, not {field}")
+    now = now or datetime.now(timezone.utc)
+    oldest = _oldest(zoho_crm, module_name, field)
+    if oldest is None:
+        return []
+    step = (now - oldest) / max(1, initial_partitions)
+    starts = [oldest] + [
+        (oldest + step * i).replace(microsecond=0)
+        for i in range(1, initial_partitions)
+    ]
+    starts = sorted(set(starts))
+    pending = [Partition(a, b) for a, b in zip(starts, starts[1:] + [None])]
+    planned = []
+    with ThreadPoolExecutor(max_workers=probe_workers) as executor:
+        while pending:
+            fits = list(
+                executor.map(
+                    lambda p: _fits(zoho_crm, module_name, p.criteria(field),
+                                    max_depth), pending))
+            halved = []
+            for partition, fit in zip(pending, fits):
+                halves = None if fit else partition.halves(now)
+                if halves:
+                    halved.extend(halves)
+                    continue
+                if not fit:
+                    LOGGER.warning(
+                        f"{module_name} has more than {max_depth} records with "
+                        f"{partition.criteria(field)}; only {max_depth} can be exported")
+                    partition = partition._replace(complete=False)
+                planned.append(partition)
+            pending = halved
+    return sorted(planned)
+
+
+_CLIENT = None  # type: ZohoCRM, one per worker process
+
+
+def _init_worker(client_factory: Callable[[], ZohoCRM]):
+    global _CLIENT  # pylint: disable=global-statement
+    _CLIENT = client_factory()
+
+
+def _export_part(module_name: str,
+                 path: Path,
+                 parameters: dict,
+                 criteria: str = None,
+                 modified_since: datetime = None,
+                 max_records: int = None) -> int:
+    """ Write the records of one search (or of the changes since modified_since)
+            to path as json lines, stopping after max_records if it is given
+            (a search fails past its depth limit). The file appears only once it is complete."""
+    codec = _CLIENT.json_codec
+    count = 0
+    tmp_path = path.with_name(path.name + ".tmp")
+    with tmp_path.open("wb") as part_file:
+        for page in _CLIENT.yield_page_from_module(
+                module_name=module_name,
+                criteria=criteria,
+                parameters=dict(parameters),
+                modified_since=modified_since):
+            part_file.write(b"".join(codec.dumps(r) + b"\n" for r in page))
+            count += len(page)
+            if max_records is not None and count >= max_records:
+                break
+    os.replace(str(tmp_path), str(path))
+    return count
+
+
+def export_module(
+        client_factory: Callable[[], ZohoCRM],
+        module_name: str,
+        out_dir: Path,
+        field: str = "Created_Time",
+        max_workers: int = 4,
+        initial_partitions: int = None,
+        parameters: dict = None,
+        mp_context=None,
+) -> ExportResult:
+    """ Export a whole module to json lines files in out_dir, one file per partition
+            (part-00000.jsonl, ...), read by max_workers processes.
+            parameters (such as {'fields': 'Last_Name,Email'}) are passed to every search."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    parameters = dict(parameters or {}, per_page=PER_PAGE)
+    started = datetime.now(timezone.utc).replace(microsecond=0)
+    partitions = plan_partitions(
+        client_factory(),
+        module_name,
+        field=field,
+        initial_partitions=initial_partitions or 2 * max_workers,
+        now=started)
+    paths = [out_dir / f"part-{i:05d}.jsonl" for i in range(len(partitions))]
+    with ProcessPoolExecutor(max_workers=max_workers,
+                             mp_context=mp_context,
+                             initializer=_init_worker,
+                             initargs=(client_factory,)) as executor:
+        records = sum(
+            executor.map(_export_part, [module_name] * len(paths), paths,
+                         [parameters] * len(paths),
+                         [p.criteria(field) for p in partitions],
+                         [None] * len(paths),
+                         [None if p.complete else MAX_DEPTH for p in partitions]))
+        if field == "Modified_Time" and partitions:
+            changes = out_dir / "part-changes.jsonl"
+            records += executor.submit(
+                _export_part, module_name, changes, parameters,
+                modified_since=started).result()
+            paths.insert(0, changes)  # the newest copies win the merge
+    return ExportResult(paths, partitions, records,
+                        [p for p in partitions if not p.complete])
+
+
+def yield_exported_pages(paths: Iterable[Path],
+                         page_size: int = PER_PAGE,
+                         codec=None) -> Generator[List[dict], None, None]:
+    """ Yields pages of the records in the json lines files of an export,
+            keeping the first copy of each record id."""
+    codec = codec or default_codec()
+    seen = set()
+    page = []
+    for path in paths:
+        with Path(path).open("rb") as part_file:
+            for line in part_file:
+                record = codec.loads(line)
+                if record["id"] in seen:
+                    continue
+                seen.add(record["id"])
+                page.append(record)
+                if len(page) == page_size:
+                    yield page
+                    page = []
+    if page:
+        yield page
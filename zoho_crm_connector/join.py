@@ -0,0 +1,224 @@
+"""
+zoho_crm_connector.join
+~~~~~~~~~~~~~~~~~~~~~~~
+
+Local joins across modules.
+
+Search criteria do not work across modules (see the notes in zoho_crm_api),
+so instead of a nested loop, or a get_related_records call per parent record,
+each joined module is read once into a hash index on its key
+and the base module is then streamed past the indexes in a single pass.
+
+Keys are dotted paths into a record, so a lookup field is joined on its id:
+
+    rows = join_modules(zoho_crm, 'Contacts',
+                        [Join('Accounts', on='Account_Name.id')])
+    for row in rows:
+        contact, account = row['Contacts'], row['Accounts']
+
+A one-to-many join indexes the child module on its lookup instead:
+
+    join_modules(zoho_crm, 'Accounts', [Join('Contacts', on='id', key='Account_Name.id')])
+
+Indexes larger than spill_threshold records are moved to a temporary sqlite database,
+so a very large module does not need to fit in memory
+(records must then be plain json-serialisable dicts).
+"""
+
+import itertools
+import json
+import os
+import sqlite3
+import tempfile
+from pathlib import Path
+from typing import (Dict, Generator, Iterable, List, NamedTuple, Optional)
+
+from .zoho_crm_api import ZohoCRM
+
+
+def get_path(record, path: str):
+    """ Follow a dotted path such as 'Account_Name.id' into a record.
+            Works for dicts and for objects with attributes (such as compact records).
+            Returns None if any part of the path is missing."""
+    value = record
+    for part in path.split("."):
+        if value is None:
+            return None
+        if isinstance(value, dict):
+            value = value.get(part)
+        else:
+            value = getattr(value, part, None)
+    return value
+
+
+class HashIndex:
+    """ A multi-map from the value at key path to the records having that value.
+            Records without a value at the key path are not indexed."""
+
+    def __init__(self,
+                 key: str,
+                 spill_threshold: int = None,
+                 spill_dir: Path = None):
+        self.key = key
+        self.spill_threshold = spill_threshold
+        self.spill_dir = spill_dir
+        self._memory = {}  # type: Dict[str, List]
+        self._count = 0
+        self._db = None  # type: Optional[sqlite3.Connection]
+        self._db_path = None  # type: Optional[str]
+
+    @property
+    def spilled(self) -> bool:
+        return self._db is not None
+
+    def __len__(self):
+        return self._count
+
+    def add(self, record):
+        key_value = get_path(record, self.key)
+        if key_value is None:
+            return
+        self._count += 1
+        if self._db is not None:
+            self._db.execute("INSERT INTO idx (k, v) VALUES (?, ?)",
+                             (str(key_value), json.dumps(record)))
+            return
+        self._memory.setdefault(str(key_value), []).append(record)
+        if self.spill_threshold is not None and self._count > self.spill_threshold:
+            self._spill()
+
+    def add_pages(self, pages: Iterable[List]):
+        for page in pages:
+            for record in page:
+                self.add(record)
+        if self._db is not None:
+            self._db.commit()
+
+    def get(self, key_value) -> List:
+        if key_value is None:
+            return []
+        if self._db is not None:
+            return [
+                json.loads(v) for (v,) in self._db.execute(
+                    "SELECT v FROM idx WHERE k = ? ORDER BY rowid",
+                    (str(key_value),))
+            ]
+        return self._memory.get(str(key_value), [])
+
+    def _spill(self):
+        fd, self._db_path = tempfile.mkstemp(
+            suffix=".sqlite",
+            prefix="zoho_join_",
+            dir=str(self.spill_dir) if self.spill_dir else None)
+        os.close(fd)
+        self._db = sqlite3.connect(self._db_path)
+        self._db.execute("CREATE TABLE idx (k TEXT NOT NULL, v TEXT NOT NULL)")
+        self._db.executemany(
+            "INSERT INTO idx (k, v) VALUES (?, ?)",
+            ((k, json.dumps(record))
+             for k, records in self._memory.items()
+             for record in records))
+        # the index is created after the bulk insert, which is much faster
+        self._db.execute("CREATE INDEX idx_k ON idx (k)")
+        self._db.commit()
+        self._memory = {}
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+            os.remove(self._db_path)
+        self._memory = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class Join(NamedTuple):
+    """ Join module_name to the base module where
+            the base record's `on` path equals the joined record's `key` path.
+            `name` is the key of the joined record in the result rows (default: module_name).
+            `parameters` are passed to yield_page_from_module (for example, fields)."""
+    module_name: str
+    on: str
+    key: str = "id"
+    name: Optional[str] = None
+    parameters: Optional[dict] = None
+
+
+def hash_join(
+        base_pages: Iterable[List],
+        indexes: Dict[str, HashIndex],
+        on: Dict[str, str],
+        base_name: str,
+        how: str = "inner",
+) -> Generator[Dict, None, None]:
+    """ Stream base records past already built indexes, yielding a dict per joined row:
+            {base_name: base_record, name: joined_record, ...}.
+            `on` maps each index name to the path in the base record which is looked up.
+            With how='inner' base records without a match in every index are dropped,
+            with how='left' missing matches are None.
+            One-to-many matches yield one row per combination."""
+    if how not in ("inner", "left"):
+        raise ValueError(f"how must be 'inner' or 'left', not {how!r}")
+    names = list(indexes)
+    for page in base_pages:
+        for record in page:
+            matches = []
+            for name in names:
+                found = indexes[name].get(get_path(record, on[name]))
+                if not found:
+                    if how == "inner":
+                        break
+                    found = [None]
+                matches.append(found)
+            else:
+                for combination in itertools.product(*matches):
+                    row = {base_name: record}
+                    row.update(zip(names, combination))
+                    yield row
+
+
+def join_modules(
+        zoho_crm: ZohoCRM,
+        module_name: str,
+        joins: List[Join],
+        how: str = "inner",
+        spill_threshold: int = None,
+        spill_dir: Path = None,
+        **kwargs,
+) -> Generator[Dict, None, None]:
+    """ Join modules in one linear pass over each module.
+            Each joined module is read into a HashIndex,
+            then module_name is streamed (kwargs go to its yield_page_from_module call,
+            so criteria and modified_since can restrict the base records)."""
+    indexes = {}  # type: Dict[str, HashIndex]
+    on = {}
+    try:
+        for join in joins:
+            name = join.name or join.module_name
+            if name in indexes or name == module_name:
+                raise ValueError(
+                    f"Duplicate name in join: {name}, please set Join.name")
+            index = HashIndex(
+                join.key,
+                spill_threshold=spill_threshold,
+                spill_dir=spill_dir)
+            indexes[name] = index
+            on[name] = join.on
+            index.add_pages(
+                zoho_crm.yield_page_from_module(
+                    module_name=join.module_name,
+                    parameters=dict(join.parameters or {})))
+        yield from hash_join(
+            zoho_crm.yield_page_from_module(module_name=module_name, **kwargs),
+            indexes,
+            on,
+            base_name=module_name,
+            how=how)
+    finally:
+        for index in indexes.values():
+            index.close()
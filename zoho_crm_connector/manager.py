@@ -0,0 +1,268 @@
+"""
+zoho_crm_connector.manager
+~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+One ZohoCRMManager for many Zoho organisations.
+
+A ZohoCRM per organisation, each with its own requests session and token file,
+wastes sockets and memory when there are hundreds of organisations,
+and nothing limits the load they put on the API together.
+The manager creates each organisation's client when it is first asked for, and:
+
+ - all clients share one connection pool (one HTTPAdapter),
+ - each request waits for a slot under a per-organisation and a global
+   concurrency limit and (optionally) rate limit,
+ - access tokens live in one SharedTokenStore keyed by organisation,
+ - the least recently used clients are evicted when there are more than max_clients
+   (or when they have been idle for idle_timeout seconds); they are recreated on demand.
+
+    manager = ZohoCRMManager(client_id, client_secret,
+                             token_store=SharedTokenStore(Path('tokens.json')),
+                             max_concurrent=50, max_concurrent_per_org=4, rate_per_org=5)
+    manager.add_org('acme', refresh_token=acme_refresh_token)
+    contacts = manager['acme'].yield_page_from_module('Contacts')
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List
+
+import requests
+
+from .token_store import SharedTokenStore
+from .zoho_crm_api import (DeadlineExceeded, ZohoCRM, _remaining_time,
+                           _requests_retry_session)
+
+
+class RateLimiter:
+    """ A token bucket: on average `rate` requests per second, in bursts of up to `burst`."""
+
+    def __init__(self, rate: float, burst: int = None):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout: float = None) -> bool:
+        """ Wait for a token; False if that would take longer than timeout."""
+        give_up = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if give_up is not None and now + wait > give_up:
+                return False
+            time.sleep(wait)
+
+
+class _Limits:
+    """ A concurrency limit and a rate limit, either of which may be None."""
+
+    def __init__(self, max_concurrent: int = None, rate: float = None):
+        self.semaphore = (threading.BoundedSemaphore(max_concurrent)
+                          if max_concurrent else None)
+        self.rate_limiter = RateLimiter(rate) if rate else None
+
+    def acquire(self, timeout: float = None) -> bool:
+        if self.semaphore is not None:
+            acquired = (self.semaphore.acquire() if timeout is None else
+                        self.semaphore.acquire(timeout=max(0, timeout)))
+            if not acquired:
+                return False
+        if self.rate_limiter is not None and not self.rate_limiter.acquire(
+                timeout):
+            self.release()
+            return False
+        return True
+
+    def release(self):
+        if self.semaphore is not None:
+            self.semaphore.release()
+
+
+class _OrgSession(requests.Session):
+    """ A session using the shared connection pool, which takes a slot
+            under each of `limits` for every request it sends."""
+
+    def __init__(self, adapter: requests.adapters.HTTPAdapter,
+                 limits: List[_Limits]):
+        super().__init__()
+        self.mount("http://", adapter)
+        self.mount("https://", adapter)
+        self.headers["Accept-Encoding"] = "gzip, deflate"
+        self._limits = limits
+        self._holding = threading.local()
+        self._active_lock = threading.Lock()
+        self.active = 0
+
+    def send(self, request, **kwargs):
+        if getattr(self._holding, "slots", False):
+            # a redirect, sent from within send: the slots are already held
+            return super().send(request, **kwargs)
+        acquired = []
+        with self._active_lock:
+            self.active += 1
+        try:
+            for limits in self._limits:
+                if not limits.acquire(_remaining_time()):
+                    raise DeadlineExceeded(
+                        "Deadline exceeded waiting for a request slot")
+                acquired.append(limits)
+            self._holding.slots = True
+            return super().send(request, **kwargs)
+        finally:
+            self._holding.slots = False
+            for limits in reversed(acquired):
+                limits.release()
+            with self._active_lock:
+                self.active -= 1
+
+    def close(self):
+        """ The connection pool is shared, so it is left open (see ZohoCRMManager.close)."""
+
+
+class _Org:
+    __slots__ = ("refresh_token", "kwargs", "limits", "lock")
+
+    def __init__(self, refresh_token: str, kwargs: dict, limits: _Limits):
+        self.refresh_token = refresh_token
+        self.kwargs = kwargs
+        self.limits = limits
+        self.lock = threading.Lock()
+
+
+class ZohoCRMManager:
+    """ Creates, shares and evicts the ZohoCRM clients of many organisations.
+            client_kwargs are passed to every ZohoCRM (add_org can override them per organisation)."""
+
+    def __init__(
+            self,
+            client_id: str,
+            client_secret: str,
+            token_store: SharedTokenStore = None,
+            max_clients: int = 100,
+            idle_timeout: float = None,
+            pool_maxsize: int = 100,
+            max_concurrent: int = 50,
+            max_concurrent_per_org: int = 4,
+            rate: float = None,
+            rate_per_org: float = None,
+            **client_kwargs,
+    ):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.token_store = token_store or SharedTokenStore()
+        self.max_clients = max_clients
+        self.idle_timeout = idle_timeout
+        self.max_concurrent_per_org = max_concurrent_per_org
+        self.rate_per_org = rate_per_org
+        self.client_kwargs = client_kwargs
+        self._adapter = _requests_retry_session(
+            pool_maxsize=pool_maxsize).get_adapter("https://")
+        self._global_limits = _Limits(max_concurrent, rate)
+        self._orgs = {}  # type: Dict[str, _Org]
+        self._clients = OrderedDict()  # type: Dict[str, ZohoCRM]
+        self._last_used = {}  # type: Dict[str, float]
+        self._lock = threading.Lock()
+
+    def add_org(self, org: str, refresh_token: str, **kwargs):
+        """ Register an organisation; kwargs (such as base_url or default_zoho_user_id)
+                override the manager's client_kwargs for it."""
+        with self._lock:
+            self._orgs[org] = _Org(
+                refresh_token, kwargs,
+                _Limits(self.max_concurrent_per_org, self.rate_per_org))
+            self._clients.pop(org, None)
+            self._last_used.pop(org, None)
+
+    def get(self, org: str) -> ZohoCRM:
+        """ The client of an organisation, created if needed."""
+        with self._lock:
+            if org not in self._orgs:
+                raise KeyError(f"Unknown organisation: {org}")
+            config = self._orgs[org]
+        with config.lock:  # one creation per organisation at a time
+            with self._lock:
+                client = self._clients.get(org)
+                if client is not None:
+                    self._clients.move_to_end(org)
+                    self._last_used[org] = time.monotonic()
+            if client is None:
+                client = self._create(org, config)
+                with self._lock:
+                    self._clients[org] = client
+                    self._last_used[org] = time.monotonic()
+        self.evict_idle()
+        return client
+
+    __getitem__ = get
+
+    def _create(self, org: str, config: _Org) -> ZohoCRM:
+        kwargs = dict(self.client_kwargs)
+        kwargs.update(config.kwargs)
+        return ZohoCRM(
+            refresh_token=config.refresh_token,
+            client_id=self.client_id,
+            client_secret=self.client_secret,
+            token_store=self.token_store.for_org(org),
+            requests_session=_OrgSession(
+                self._adapter, [config.limits, self._global_limits]),
+            **kwargs)
+
+    def evict_idle(self) -> List[str]:
+        """ Evict clients idle for longer than idle_timeout, then the least recently used
+                idle clients beyond max_clients. Clients with requests in flight are kept.
+                An evicted client is only dropped from the cache: a caller still holding it
+                (between the pages of a pagination, say) can go on using it.
+                Returns the evicted organisations."""
+        now = time.monotonic()
+        evicted_orgs = []
+        with self._lock:
+            for org, client in list(self._clients.items()):
+                over_capacity = len(self._clients) > self.max_clients
+                expired = (self.idle_timeout is not None and
+                           now - self._last_used[org] > self.idle_timeout)
+                if not (over_capacity or expired):
+                    continue
+                if client.requests_session.active:
+                    continue
+                del self._clients[org]
+                del self._last_used[org]
+                evicted_orgs.append(org)
+        return evicted_orgs
+
+    @staticmethod
+    def _close_client(client: ZohoCRM):
+        if client._hedge_executor is not None:  # pylint: disable=protected-access
+            client._hedge_executor.shutdown(wait=False)  # pylint: disable=protected-access
+
+    @property
+    def clients(self) -> List[str]:
+        """ The organisations with a live client, least recently used first."""
+        with self._lock:
+            return list(self._clients)
+
+    def close(self):
+        """ Drop every client and close the shared connection pool
+                (and the hedging threads of the clients still cached)."""
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+            self._last_used.clear()
+        for client in clients:
+            self._close_client(client)
+        self._adapter.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,317 @@
+"""
+zoho_crm_connector.notifications
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Push-based change ingestion with Zoho's notifications (watch) API, instead of polling
+yield_page_from_module(modified_since=...).
+
+NotificationChannels registers a channel per module and event with a notify_url
+and token, and renews each channel before it expires (Zoho allows at most one day).
+NotificationReceiver is a small embedded HTTP server for that notify_url: it checks the
+channel's token and puts a ChangeEvent on a queue for each notification.
+yield_changed_records batches the queued ids per module and fetches the records,
+100 ids per call:
+
+    receiver = NotificationReceiver(port=8080)
+    channels = NotificationChannels(zoho_crm, 'https://example.com:8080/zoho/notifications',
+                                    tokens=receiver.tokens)
+    channels.watch('Deals')
+    receiver.start()
+    channels.start()
+    for module_name, operation, records in yield_changed_records(zoho_crm, receiver.queue):
+        ...
+
+The notify_url must be reachable by Zoho, which usually means a public https endpoint
+(a reverse proxy in front of the receiver).
+"""
+
+import hmac
+import itertools
+import json
+import queue
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import (Dict, Generator, Iterable, List, NamedTuple, Optional,
+                    Tuple)
+
+from .zoho_crm_api import LOGGER, ZohoCRM
+
+MAX_CHANNEL_LIFETIME = timedelta(days=1)
+MAX_IDS_PER_CALL = 100
+MAX_NOTIFICATION_BYTES = 256 * 1024  # larger bodies are refused with 413
+
+
+class ChangeEvent(NamedTuple):
+    """ One notification: the ids of records of module_name which were
+            inserted, updated or deleted (operation)."""
+    module_name: str
+    operation: str
+    ids: Tuple[str, ...]
+    channel_id: str
+
+
+class NotificationReceiver:
+    """ An HTTP server which accepts notifications POSTed by Zoho to path.
+            tokens maps channel_id to the token it was registered with
+            (NotificationChannels fills it in); notifications with another token are rejected.
+            A body without a valid Content-Length gets 400, one over max_body_bytes 413."""
+
+    def __init__(self,
+                 host: str = "0.0.0.0",
+                 port: int = 8080,
+                 path: str = "/zoho/notifications",
+                 events: queue.Queue = None,
+                 max_body_bytes: int = MAX_NOTIFICATION_BYTES):
+        self.path = path
+        self.max_body_bytes = max_body_bytes
+        self.tokens = {}  # type: Dict[str, str]
+        self.queue = events or queue.Queue()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None  # type: threading.Thread
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self._server.server_address[:2]
+
+    def _handler_class(self):
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_POST(self):  # pylint: disable=invalid-name
+                status = receiver.content_length_status(
+                    self.headers.get("Content-Length"))
+                if status is None:
+                    status = receiver.handle(
+                        self.path,
+                        self.rfile.read(int(self.headers["Content-Length"])))
+                else:
+                    self.close_connection = True  # the body was not read
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+                LOGGER.debug("notification receiver: " + format % args)
+
+        return Handler
+
+    def content_length_status(self, content_length: str) -> Optional[int]:
+        """ None if the body can be read, otherwise the HTTP status to reply with."""
+        try:
+            length = int(content_length)
+        except (TypeError, ValueError):
+            return 400
+        if length < 0:
+            return 400
+        if length > self.max_body_bytes:
+            return 413
+        return None
+
+    def handle(self, path: str, body: bytes) -> int:
+        """ Validate one notification and queue it; returns the HTTP status to reply with."""
+        if path.split("?")[0] != self.path:
+            return 404
+        try:
+            notification = json.loads(body)
+            channel_id = str(notification["channel_id"])
+            token = notification.get("token") or ""
+            if not isinstance(token, str):
+                raise TypeError(f"token must be a string, not {type(token)}")
+            event = ChangeEvent(
+                module_name=notification["module"],
+                operation=notification["operation"],
+                ids=tuple(str(i) for i in notification["ids"]),
+                channel_id=channel_id)
+        except (ValueError, KeyError, TypeError):
+            return 400
+        expected = self.tokens.get(channel_id)
+        if expected is None or not hmac.compare_digest(
+                token.encode(), expected.encode()):
+            LOGGER.warning(
+                f"Rejected a notification for channel {channel_id}: bad token")
+            return 403
+        self.queue.put(event)
+        return 200
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._server.serve_forever,
+            name="zoho-notification-receiver",
+            daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread:
+            self._thread.join()
+
+
+class _Channel:
+    __slots__ = ("channel_id", "events", "token", "expiry")
+
+    def __init__(self, channel_id: str, events: List[str], token: str,
+                 expiry: datetime):
+        self.channel_id = channel_id
+        self.events = events
+        self.token = token
+        self.expiry = expiry
+
+
+class NotificationChannels:
+    """ Subscribes and renews notification channels.
+            tokens is shared with a NotificationReceiver, so that it accepts the new channels."""
+
+    def __init__(self,
+                 zoho_crm: ZohoCRM,
+                 notify_url: str,
+                 tokens: Dict[str, str] = None,
+                 lifetime: timedelta = timedelta(hours=23),
+                 renew_before: timedelta = timedelta(hours=1)):
+        if lifetime > MAX_CHANNEL_LIFETIME:
+            raise ValueError(
+                f"Channels can live at most {MAX_CHANNEL_LIFETIME}")
+        self.zoho_crm = zoho_crm
+        self.notify_url = notify_url
+        self.tokens = tokens if tokens is not None else {}
+        self.lifetime = lifetime
+        self.renew_before = renew_before
+        self.channels = OrderedDict()  # type: Dict[str, _Channel]
+        self._ids = itertools.count(int(time.time() * 1000))
+        self._stop = threading.Event()
+        self._thread = None  # type: threading.Thread
+
+    def _watch_entry(self, channel: _Channel, expiry: datetime = None) -> dict:
+        return {
+            "channel_id": channel.channel_id,
+            "events": channel.events,
+            "channel_expiry": (expiry or channel.expiry).isoformat(
+                timespec="seconds"),
+            "token": channel.token,
+            "notify_url": self.notify_url,
+        }
+
+    def watch(self,
+              module_name: str,
+              operations: Iterable[str] = ("all",),
+              channel_id: str = None) -> str:
+        """ Subscribe a channel to module_name events
+                (operations: all, or some of create, edit, delete).
+                Returns the channel id."""
+        channel = _Channel(
+            channel_id=channel_id or str(next(self._ids)),
+            events=[f"{module_name}.{operation}" for operation in operations],
+            token=secrets.token_hex(25),  # Zoho allows at most 50 characters
+            expiry=datetime.now(timezone.utc) + self.lifetime)
+        self.tokens[channel.channel_id] = channel.token
+        success, r_json = self.zoho_crm.enable_notifications(
+            [self._watch_entry(channel)])
+        if not success:
+            del self.tokens[channel.channel_id]
+            raise RuntimeError(
+                f"Could not subscribe notifications for {module_name}: {r_json}"
+            )
+        self.channels[channel.channel_id] = channel
+        return channel.channel_id
+
+    def renew_due(self, now: datetime = None) -> List[str]:
+        """ Extend the channels which expire within renew_before. Returns their ids.
+                The channels keep their expiry unless Zoho accepts the renewal,
+                so that a failed renewal is retried at the next check."""
+        now = now or datetime.now(timezone.utc)
+        due = [
+            c for c in self.channels.values()
+            if c.expiry - now <= self.renew_before
+        ]
+        if not due:
+            return []
+        expiry = now + self.lifetime
+        success, r_json = self.zoho_crm.update_notifications(
+            [self._watch_entry(c, expiry) for c in due])
+        if not success:
+            raise RuntimeError(f"Could not renew notification channels: {r_json}")
+        for channel in due:
+            channel.expiry = expiry
+        return [c.channel_id for c in due]
+
+    def unwatch_all(self):
+        if self.channels:
+            self.zoho_crm.disable_notifications(list(self.channels))
+        for channel_id in self.channels:
+            self.tokens.pop(channel_id, None)
+        self.channels.clear()
+
+    def _run(self, check_every: float):
+        while not self._stop.wait(check_every):
+            try:
+                self.renew_due()
+            except Exception as e:  # pylint: disable=broad-except
+                # try again at the next check; renew_before leaves time for that
+                LOGGER.warning(f"Renewing notification channels failed: {e}")
+
+    def start(self, check_every: float = 60):
+        """ Renew channels in a background thread."""
+        self._thread = threading.Thread(
+            target=self._run,
+            args=(check_every,),
+            name="zoho-notification-renewal",
+            daemon=True)
+        self._thread.start()
+
+    def stop(self, unwatch: bool = True):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        if unwatch:
+            self.unwatch_all()
+
+
+def drain_changed_ids(events: queue.Queue,
+                      wait: float = 1.0,
+                      max_ids: int = MAX_IDS_PER_CALL
+                     ) -> Dict[Tuple[str, str], List[str]]:
+    """ Wait up to `wait` seconds for a first event, then take whatever else is queued
+            (up to about max_ids ids), merged per (module_name, operation) without duplicates.
+            A record which was edited and then deleted appears under both operations."""
+    batches = OrderedDict()  # type: Dict[Tuple[str, str], Dict[str, None]]
+    count = 0
+    try:
+        event = events.get(timeout=wait)
+        while True:
+            ids = batches.setdefault((event.module_name, event.operation),
+                                     OrderedDict())
+            for record_id in event.ids:
+                if record_id not in ids:
+                    ids[record_id] = None
+                    count += 1
+            if count >= max_ids:
+                break
+            event = events.get_nowait()
+    except queue.Empty:
+        pass
+    return {key: list(ids) for key, ids in batches.items()}
+
+
+def yield_changed_records(
+        zoho_crm: ZohoCRM,
+        events: queue.Queue,
+        wait: float = 1.0,
+        stop: threading.Event = None,
+) -> Generator[Tuple[str, str, List[dict]], None, None]:
+    """ Yields (module_name, operation, records) for the changes on the events queue,
+            until stop is set. Inserted and updated records are fetched in batches;
+            deleted records can not be fetched, so they are yielded as [{'id': ...}]."""
+    while not (stop and stop.is_set()):
+        for (module_name, operation), ids in drain_changed_ids(
+                events, wait=wait).items():
+            if operation == "delete":
+                yield module_name, operation, [{"id": i} for i in ids]
+                continue
+            for page in zoho_crm.yield_records_by_ids(module_name, ids):
+                yield module_name, operation, page
@@ -0,0 +1,173 @@
+"""
+zoho_crm_connector.profiling
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Profile a script which uses ZohoCRM against a recorded cassette
+(see zoho_crm_connector.cassette), so that real traffic shapes can be profiled
+offline and repeatably.
+
+Record once against the live API, then profile as often as needed:
+
+    python -m zoho_crm_connector.profiling --record contacts.jsonl.gz export_contacts.py
+    python -m zoho_crm_connector.profiling contacts.jsonl.gz export_contacts.py
+
+The script runs twice from the cassette: once under cProfile, for the time spent in
+each ZohoCRM member function, and once under tracemalloc, for the peak memory and the
+lines holding the most memory at the end (tracing allocations would distort the timings).
+With --latency-scale 1 the recorded latencies are replayed as well.
+"""
+
+import argparse
+import cProfile
+import inspect
+import pstats
+import runpy
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List, NamedTuple, Sequence
+
+from .cassette import recording, replaying
+from .zoho_crm_api import ZohoCRM
+
+
+class MethodTiming(NamedTuple):
+    """ The calls of one ZohoCRM member function, with the time spent in it
+            (including what it called) and the time spent in its own code."""
+    method: str
+    calls: int
+    seconds: float
+    own_seconds: float
+
+
+class Allocation(NamedTuple):
+    location: str
+    size: int
+    count: int
+
+
+class ProfileReport(NamedTuple):
+    wall_seconds: float
+    methods: List[MethodTiming]
+    peak_bytes: int
+    allocations: List[Allocation]
+
+    def format(self) -> str:
+        lines = [f"wall time: {self.wall_seconds:.3f} s", "",
+                 f"{'ZohoCRM method':<36}{'calls':>8}{'total s':>10}{'own s':>10}"]
+        lines += [
+            f"{m.method:<36}{m.calls:>8}{m.seconds:>10.3f}{m.own_seconds:>10.3f}"
+            for m in self.methods
+        ]
+        lines += ["", f"peak memory: {self.peak_bytes / 2**20:.1f} MiB", "",
+                  f"{'allocated at':<60}{'KiB':>10}{'blocks':>10}"]
+        lines += [
+            f"{a.location:<60}{a.size / 1024:>10.1f}{a.count:>10}"
+            for a in self.allocations
+        ]
+        return "\n".join(lines)
+
+
+@contextmanager
+def _script_argv(script: Path, argv: Sequence[str]):
+    saved = sys.argv
+    sys.argv = [str(script)] + list(argv)
+    try:
+        yield
+    finally:
+        sys.argv = saved
+
+
+def _run(script: Path, argv: Sequence[str]):
+    with _script_argv(script, argv):
+        try:
+            runpy.run_path(str(script), run_name="__main__")
+        except SystemExit as e:
+            if e.code not in (None, 0):
+                raise
+
+
+def _zoho_crm_methods() -> dict:
+    """ (filename, first line, name) of each ZohoCRM member function's code, as pstats keys it."""
+    methods = {}
+    for name, member in vars(ZohoCRM).items():
+        function = inspect.unwrap(getattr(member, "__func__", member))
+        code = getattr(function, "__code__", None)
+        if code is not None:
+            methods[(code.co_filename, code.co_firstlineno, code.co_name)] = name
+    return methods
+
+
+def _method_timings(profiler: cProfile.Profile) -> List[MethodTiming]:
+    methods = _zoho_crm_methods()
+    timings = [
+        MethodTiming(methods[key], calls, cumulative, own)
+        for key, (_, calls, own, cumulative, _) in pstats.Stats(
+            profiler).stats.items()  # pylint: disable=no-member
+        if key in methods
+    ]
+    return sorted(timings, key=lambda t: t.seconds, reverse=True)
+
+
+def profile_script(script: Path,
+                   cassette: Path,
+                   argv: Sequence[str] = (),
+                   latency_scale: float = 0.0,
+                   top: int = 15) -> ProfileReport:
+    """ Run script (with sys.argv[1:] = argv) against the cassette and profile it."""
+    profiler = cProfile.Profile()
+    with replaying(cassette, latency_scale):
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            _run(script, argv)
+        finally:
+            profiler.disable()
+        wall_seconds = time.perf_counter() - start
+
+    with replaying(cassette, latency_scale):
+        tracemalloc.start()
+        try:
+            _run(script, argv)
+            snapshot = tracemalloc.take_snapshot()
+            _, peak_bytes = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    snapshot = snapshot.filter_traces(
+        [tracemalloc.Filter(False, tracemalloc.__file__)])
+    allocations = [
+        Allocation(str(s.traceback[0]), s.size, s.count)
+        for s in snapshot.statistics("lineno")[:top]
+    ]
+    return ProfileReport(wall_seconds, _method_timings(profiler), peak_bytes,
+                         allocations)
+
+
+def main(args: Sequence[str] = None):
+    parser = argparse.ArgumentParser(
+        prog="python -m zoho_crm_connector.profiling",
+        description="Profile a ZohoCRM script against a recorded cassette.")
+    parser.add_argument("--record", action="store_true",
+                        help="run the script live and record the cassette")
+    parser.add_argument("--latency-scale", type=float, default=0.0,
+                        help="replay the recorded latencies times this (default 0)")
+    parser.add_argument("--top", type=int, default=15,
+                        help="allocation hotspots to show")
+    parser.add_argument("cassette", type=Path)
+    parser.add_argument("script", type=Path)
+    parser.add_argument("script_args", nargs=argparse.REMAINDER)
+    options = parser.parse_args(args)
+    if options.record:
+        with recording(options.cassette):
+            _run(options.script, options.script_args)
+        print(f"recorded {options.cassette}")
+        return
+    print(
+        profile_script(options.script, options.cassette, options.script_args,
+                       options.latency_scale, options.top).format())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+zoho_crm_connector.records
+~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Compact, schema-typed records for holding large modules in memory.
+
+yield_page_from_module returns plain dicts of strings, and every lookup is a nested
+{name, id} dict. That is convenient but expensive when a million Contacts are kept
+around for joins. Here a record type with __slots__ is built from the module's field
+metadata (see ZohoCRM.get_module_fields). Values are decoded once:
+dates, datetimes, numbers and booleans become Python objects,
+lookups become a Lookup (id, name) tuple and picklist values and owner names are interned,
+so repeated values share one string object.
+
+Keys in the json which are not described by the field metadata (such as $approved) are dropped.
+
+Example:
+    Contact = make_record_type('Contacts', zoho_crm.get_module_fields('Contacts'))
+    for page in yield_compact_pages(zoho_crm, 'Contacts', record_type=Contact):
+        ...
+"""
+
+import keyword
+import sys
+from datetime import date, datetime
+from typing import Callable, Dict, Generator, List, NamedTuple, Optional, Type
+
+from .zoho_crm_api import ZohoCRM
+
+
+class Lookup(NamedTuple):
+    """ A decoded lookup field: the {name, id} object of the json."""
+    id: str
+    name: Optional[str]
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _to_int(value):
+    return int(value)
+
+
+def _to_float(value):
+    return float(value)
+
+
+def _to_bool(value):
+    if isinstance(value, str):
+        return value.lower() == "true"
+    return bool(value)
+
+
+def _to_date(value):
+    return date.fromisoformat(value)
+
+
+def _to_datetime(value):
+    return datetime.fromisoformat(value)
+
+
+def _to_multi_picklist(value):
+    return tuple(_intern(v) for v in value)
+
+
+def _lookup_decoder(shared: bool) -> Callable:
+    """ Lookups to users (Owner, Created_By ...) have few distinct values,
+            so one Lookup object is shared per user. Other lookups only intern their strings."""
+    cache = {}  # type: Dict[tuple, Lookup]
+
+    def decode(value):
+        if not isinstance(value, dict):
+            return value
+        key = (value.get("id"), value.get("name"))
+        if not shared:
+            return Lookup(_intern(key[0]), _intern(key[1]))
+        lookup = cache.get(key)
+        if lookup is None:
+            lookup = cache[key] = Lookup(_intern(key[0]), _intern(key[1]))
+        return lookup
+
+    return decode
+
+
+# the data_types whose json value is a {name, id} object
+LOOKUP_TYPES = ("lookup", "ownerlookup", "userlookup")
+
+# Zoho field data_type -> decoder factory. Types not listed are kept as they are in the json.
+_DECODERS = {
+    "integer": lambda: _to_int,
+    "bigint": lambda: _to_int,
+    "double": lambda: _to_float,
+    "currency": lambda: _to_float,
+    "decimal": lambda: _to_float,
+    "percent": lambda: _to_float,
+    "boolean": lambda: _to_bool,
+    "date": lambda: _to_date,
+    "datetime": lambda: _to_datetime,
+    "picklist": lambda: _intern,
+    "multiselectpicklist": lambda: _to_multi_picklist,
+    "lookup": lambda: _lookup_decoder(shared=False),
+    "ownerlookup": lambda: _lookup_decoder(shared=True),
+    "userlookup": lambda: _lookup_decoder(shared=True),
+}
+
+
+def _identity(value):
+    return value
+
+
+class CompactRecord:
+    """ Base class of the record types made by make_record_type.
+            Fields are read as attributes: contact.Last_Name, contact.Account_Name.id"""
+    __slots__ = ()
+    module_name = None  # type: str
+    _fields = ()  # type: tuple
+    _decoders = ()  # type: tuple
+
+    @classmethod
+    def from_dict(cls, record: dict) -> "CompactRecord":
+        """ Decode one record as returned by the Zoho API."""
+        obj = cls.__new__(cls)
+        for name, decode in cls._decoders:
+            value = record.get(name)
+            setattr(obj, name, None if value is None else decode(value))
+        return obj
+
+    def as_dict(self) -> dict:
+        """ The decoded values as a dict (lookups stay as Lookup tuples)."""
+        return {name: getattr(self, name) for name in self._fields}
+
+    def __getitem__(self, name: str):
+        try:
+            return getattr(self, name)
+        except AttributeError:
+            raise KeyError(name)
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return all(
+            getattr(self, name) == getattr(other, name)
+            for name in self._fields)
+
+    def __repr__(self):
+        return f"{type(self).__name__}(id={getattr(self, 'id', None)!r})"
+
+
+def make_record_type(module_name: str,
+                     fields: List[dict]) -> Type[CompactRecord]:
+    """ Build a __slots__ record class from field metadata
+            (the list returned by ZohoCRM.get_module_fields).
+            api_names which are not valid Python identifiers
+            (or which clash with CompactRecord's own attributes) are skipped."""
+    decoders = [("id", _identity)]
+    for field in fields:
+        api_name = field["api_name"]
+        if (api_name == "id" or not api_name.isidentifier() or
+                keyword.iskeyword(api_name) or hasattr(CompactRecord, api_name)):
+            continue
+        factory = _DECODERS.get(field.get("data_type"))
+        decoders.append((api_name, factory() if factory else _identity))
+    names = tuple(name for name, _ in decoders)
+    class_name = "".join(c for c in module_name if c.isalnum()) or "Record"
+    return type(
+        class_name, (CompactRecord,), {
+            "__slots__": names,
+            "module_name": module_name,
+            "_fields": names,
+            "_decoders": tuple(decoders),
+        })
+
+
+def yield_compact_pages(
+        zoho_crm: ZohoCRM,
+        module_name: str,
+        record_type: Type[CompactRecord] = None,
+        **kwargs,
+) -> Generator[List[CompactRecord], None, None]:
+    """ Like ZohoCRM.yield_page_from_module (kwargs are passed through)
+            but yields pages of compact records. If record_type is not given,
+            it is built from the module's field metadata."""
+    if record_type is None:
+        record_type = make_record_type(
+            module_name, zoho_crm.get_module_fields(module_name))
+    from_dict = record_type.from_dict
+    for page in zoho_crm.yield_page_from_module(
+            module_name=module_name, **kwargs):
+        yield [from_dict(record) for record in page]
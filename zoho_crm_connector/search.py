@@ -0,0 +1,175 @@
+"""
+zoho_crm_connector.search
+~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Searches which are too big for one call to the search endpoint.
+
+The search endpoint accepts at most 10 criteria (see ZohoCRM.yield_page_from_module),
+so "accounts with any of these 3,000 names" is split into 300 criteria strings.
+search_module runs these searches on a thread pool and yields each page of results as it arrives,
+de-duplicated by record id.
+
+When the size of the module is known (estimated_records), and reading the whole module
+needs fewer calls than the searches, the module is scanned instead and filtered locally.
+A search which matches more than a page of records takes several calls: matches_per_value
+(how many records each value is expected to match, say for starts_with) is taken into account.
+
+    names = AnyOf('Account_Name', account_names)
+    for page in search_module(zoho_crm, 'Accounts', names, estimated_records=20000):
+        ...
+"""
+
+import math
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Generator, Iterable, List, NamedTuple
+
+from .join import get_path
+from .zoho_crm_api import ZohoCRM
+
+MAX_CRITERIA = 10  # per call to the search endpoint
+PER_PAGE = 200  # the maximum page size of the API
+
+
+class AnyOf(NamedTuple):
+    """ Matches records where field `operator` (equals or starts_with) any of values."""
+    field: str
+    values: Iterable[str]
+    operator: str = "equals"
+
+
+def escape_criteria_value(value: str) -> str:
+    """ Parentheses and commas in a criteria value must be escaped with a backslash."""
+    return (str(value).replace("\\", "\\\\").replace("(", "\\(").replace(
+        ")", "\\)").replace(",", "\\,"))
+
+
+def _distinct(values: Iterable[str]) -> List[str]:
+    return list(dict.fromkeys(values))
+
+
+def criteria_strings(search: AnyOf,
+                     max_criteria: int = MAX_CRITERIA) -> List[str]:
+    """ Split a search into criteria strings of at most max_criteria conditions,
+            such as ((Account_Name:equals:A)or(Account_Name:equals:B))"""
+    if search.operator not in ("equals", "starts_with"):
+        raise ValueError(
+            f"operator must be equals or starts_with, not {search.operator}")
+    conditions = [
+        f"({search.field}:{search.operator}:{escape_criteria_value(v)})"
+        for v in _distinct(search.values)
+    ]
+    return [
+        "(" + "or".join(conditions[i:i + max_criteria]) + ")"
+        for i in range(0, len(conditions), max_criteria)
+    ]
+
+
+def plan_search(search: AnyOf,
+                estimated_records: int = None,
+                max_criteria: int = MAX_CRITERIA,
+                per_page: int = PER_PAGE,
+                matches_per_value: float = 1.0) -> str:
+    """ Return 'scan' when reading the whole module takes fewer calls
+            than the searches, otherwise 'search'. Each search takes a call per page
+            of the records it is expected to match (matches_per_value for each value).
+            Without an estimate of the module size, always 'search'."""
+    if estimated_records is None:
+        return "search"
+    values = len(_distinct(search.values))
+    search_calls = 0
+    for start in range(0, values, max_criteria):
+        matches = min(estimated_records,
+                      min(max_criteria, values - start) * matches_per_value)
+        search_calls += max(1, math.ceil(matches / per_page))
+    scan_calls = max(1, math.ceil(estimated_records / per_page))
+    return "scan" if scan_calls < search_calls else "search"
+
+
+def local_filter(search: AnyOf):
+    """ A predicate matching records the way the search endpoint does,
+            that is, ignoring case. Lookup fields are matched on their name."""
+    values = [str(v).casefold() for v in _distinct(search.values)]
+    value_set = set(values)
+    starts_with = tuple(values)
+
+    def matches(record) -> bool:
+        value = get_path(record, search.field)
+        if isinstance(value, dict):
+            value = value.get("name")
+        if value is None:
+            return False
+        value = str(value).casefold()
+        if search.operator == "equals":
+            return value in value_set
+        return value.startswith(starts_with)
+
+    return matches
+
+
+def search_module(
+        zoho_crm: ZohoCRM,
+        module_name: str,
+        search: AnyOf,
+        max_workers: int = 4,
+        estimated_records: int = None,
+        parameters: dict = None,
+        matches_per_value: float = 1.0,
+) -> Generator[List[dict], None, None]:
+    """ Yields pages of records matching search, without duplicates.
+            Pages are yielded as the searches fetch them, in no particular order."""
+    parameters = parameters or {}
+    seen = set()
+
+    def new_records(page: List[dict]) -> List[dict]:
+        fresh = [r for r in page if r["id"] not in seen]
+        seen.update(r["id"] for r in fresh)
+        return fresh
+
+    if plan_search(search,
+                   estimated_records,
+                   per_page=parameters.get("per_page", PER_PAGE),
+                   matches_per_value=matches_per_value) == "scan":
+        matches = local_filter(search)
+        for page in zoho_crm.yield_page_from_module(
+                module_name=module_name, parameters=dict(parameters)):
+            fresh = new_records([r for r in page if matches(r)])
+            if fresh:
+                yield fresh
+        return
+
+    pages = queue.Queue()  # pages, and each search's future once it is done
+    stop = threading.Event()
+
+    def run(criteria: str):
+        for page in zoho_crm.yield_page_from_module(
+                module_name=module_name,
+                criteria=criteria,
+                parameters=dict(parameters)):
+            if stop.is_set():
+                return
+            pages.put(page)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(run, criteria)
+            for criteria in criteria_strings(search)
+        ]
+        for future in futures:
+            future.add_done_callback(pages.put)
+        try:
+            running = len(futures)
+            while running:
+                item = pages.get()
+                if isinstance(item, Future):
+                    item.result()  # raises the search's error
+                    running -= 1
+                    continue
+                fresh = new_records(item)
+                if fresh:
+                    yield fresh
+        finally:
+            stop.set()
+            for future in futures:
+                future.cancel()
@@ -0,0 +1,69 @@
+""" Stand-ins for the HTTP layer, for the tests which run without a Zoho connection."""
+
+import json
+from pathlib import Path
+from unittest import mock
+from zoho_crm_connector import ZohoCRM
+
+
+class FakeResponse:
+  reason = text = url = 'fake'
+
+  def __init__(self, status_code, body=None, headers=None):
+    self.status_code = status_code
+    self.body = body
+    self.content = json.dumps(body).encode() if body is not None else b''
+    self.headers = headers or {}
+
+  @property
+  def ok(self):
+    return self.status_code < 400
+
+  def json(self):
+    return self.body
+
+
+def offline_crm(session, **kwargs) -> ZohoCRM:
+  """ A ZohoCRM using `session` for requests, which never loads an access token."""
+  with mock.patch.object(ZohoCRM, '_load_access_token',
+                         return_value={'access_token': 'token'}):
+    crm = ZohoCRM(refresh_token='refresh',
+                  client_id='client',
+                  client_secret='secret',
+                  token_file_dir=Path('unused'),
+                  base_url='https://example.com/crm/v2/',
+                  **kwargs)
+  crm.requests_session = session
+  return crm
+
+
+# Contacts field metadata and a contact, as the API returns them
+FIELDS = [
+    {'api_name': 'Last_Name', 'data_type': 'text'},
+    {'api_name': 'Lead_Source', 'data_type': 'picklist'},
+    {'api_name': 'Owner', 'data_type': 'ownerlookup'},
+    {'api_name': 'Account_Name', 'data_type': 'lookup'},
+    {'api_name': 'Date_of_Birth', 'data_type': 'date'},
+    {'api_name': 'Modified_Time', 'data_type': 'datetime'},
+    {'api_name': 'Email_Opt_Out', 'data_type': 'boolean'},
+    {'api_name': 'Annual_Spend', 'data_type': 'currency'},
+    {'api_name': 'Number_Of_Staff', 'data_type': 'integer'},
+    {'api_name': 'Tag', 'data_type': 'multiselectpicklist'},
+]
+
+
+def contact(record_id, owner_name='Tim Richardson'):
+  return {
+      'id': record_id,
+      'Last_Name': 'Richardson',
+      'Lead_Source': 'Cold Call',
+      'Owner': {'name': owner_name, 'id': '100'},
+      'Account_Name': {'name': 'GrowthPath Pty Ltd', 'id': '200'},
+      'Date_of_Birth': '1980-05-17',
+      'Modified_Time': '2019-05-01T10:00:00+10:00',
+      'Email_Opt_Out': False,
+      'Annual_Spend': '1234.50',
+      'Number_Of_Staff': '12',
+      'Tag': ['a', 'b'],
+      '$approved': True,
+  }
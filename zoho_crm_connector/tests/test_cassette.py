@@ -0,0 +1,110 @@
+""" Recording and replaying cassettes, with a stand-in transport instead of the live API."""
+
+import gzip
+import json
+
+import pytest
+import requests
+from requests.adapters import BaseAdapter
+
+from zoho_crm_connector import SharedTokenStore, ZohoCRM
+from zoho_crm_connector.cassette import (CassetteMiss, _response_body,
+                                         recording_session, replay_session,
+                                         replaying, scrub_url)
+from zoho_crm_connector.profiling import profile_script
+
+FIELDS = {'fields': [{'api_name': 'Last_Name', 'data_type': 'text'}]}
+
+
+class ZohoAdapter(BaseAdapter):
+  """ Hands out an access token and answers GETs of field metadata."""
+
+  def __init__(self):
+    super().__init__()
+    self.sent = 0
+
+  def send(self, request, **kwargs):
+    self.sent += 1
+    response = requests.Response()
+    response.request, response.url = request, request.url
+    response.headers['Content-Type'] = 'application/json'
+    if 'oauth' in request.url:
+      body = {'access_token': 'live-access-token', 'expires_in': 3600}
+    else:
+      body = FIELDS
+    response.status_code = 200
+    response._content = json.dumps(body).encode()
+    return response
+
+  def close(self):
+    pass
+
+
+def make_crm(session):
+  return ZohoCRM(refresh_token='live-refresh-token',
+                 client_id='live-client-id',
+                 client_secret='live-client-secret',
+                 token_store=SharedTokenStore().for_org('test'),
+                 requests_session=session)
+
+
+@pytest.fixture
+def cassette(tmp_path):
+  path = tmp_path / 'fields.jsonl.gz'
+  adapter = ZohoAdapter()
+  session = requests.Session()
+  session.mount('https://', adapter)
+  crm = make_crm(recording_session(path, session=session))
+  assert crm.get_module_fields('Contacts') == FIELDS['fields']
+  session.close()
+  assert adapter.sent == 2
+  return path
+
+
+def test_secrets_are_scrubbed(cassette):
+  text = gzip.decompress(cassette.read_bytes()).decode()
+  assert 'module=Contacts' in text
+  for secret in ('live-access-token', 'live-refresh-token', 'live-client-id',
+                 'live-client-secret'):
+    assert secret not in text
+
+
+def test_replay(cassette):
+  crm = make_crm(replay_session(cassette))
+  assert crm.get_module_fields('Contacts') == FIELDS['fields']
+  assert crm.get_module_fields('Contacts') == FIELDS['fields']  # answers repeat
+  with pytest.raises(CassetteMiss):
+    crm.get_module_fields('Deals')
+
+
+def test_replaying_patches_every_session(cassette):
+  with replaying(cassette):
+    crm = make_crm(None)  # the default session of ZohoCRM
+    assert crm.get_module_fields('Contacts') == FIELDS['fields']
+
+
+def test_profile_script(cassette, tmp_path):
+  script = tmp_path / 'script.py'
+  script.write_text(
+      'import sys\n'
+      'from zoho_crm_connector import SharedTokenStore, ZohoCRM\n'
+      'crm = ZohoCRM("live-refresh-token", "live-client-id", "live-client-secret",\n'
+      '              token_store=SharedTokenStore().for_org("test"))\n'
+      'kept = [crm.get_module_fields(sys.argv[1]) for _ in range(3)]\n')
+  report = profile_script(script, cassette, argv=['Contacts'])
+  timings = {m.method: m for m in report.methods}
+  assert timings['get_module_fields'].calls == 3
+  assert timings['_refresh_access_token'].calls == 1
+  assert report.peak_bytes > 0
+  assert report.allocations
+  assert 'get_module_fields' in report.format()
+
+
+def test_status_codes_are_kept():
+  response = requests.Response()
+  response._content = json.dumps({'data': [{
+      'code': 'SUCCESS', 'details': {'id': '1'}, 'status': 'success'}]}).encode()
+  recorded = json.loads(_response_body(response)['body'])
+  assert recorded['data'][0]['code'] == 'SUCCESS'
+  assert scrub_url('https://accounts.zoho.com/oauth/v2/token?code=grant') == (
+      'https://accounts.zoho.com/oauth/v2/token?code=SCRUBBED')
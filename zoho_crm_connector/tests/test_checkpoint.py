@@ -0,0 +1,70 @@
+""" Resumable pagination, against a stand-in for the requests session."""
+
+import urllib.parse
+from datetime import datetime, timezone
+import pytest
+from zoho_crm_connector.checkpoint import Checkpoint
+from zoho_crm_connector.tests.fakes import FakeResponse, offline_crm
+
+
+class FakeSession:
+  """ Serves `pages` pages of one record each."""
+
+  def __init__(self, pages):
+    self.pages = pages
+    self.requested = []
+    self.tokens = []
+
+  def get(self, url, headers, params, timeout):
+    page = int(dict(urllib.parse.parse_qsl(params))['page'])
+    self.requested.append(page)
+    self.tokens.append(headers['Authorization'])
+    return FakeResponse(200, {
+        'data': [{'id': str(page)}],
+        'info': {'more_records': page < self.pages}
+    })
+
+
+def test_resume_after_failure(tmp_path):
+  path = tmp_path / 'contacts.json'
+  crm = offline_crm(FakeSession(pages=5))
+  seen = []
+  with pytest.raises(RuntimeError):
+    for page in crm.yield_page_from_module(
+        'Contacts', checkpoint=Checkpoint(path)):
+      if page[0]['id'] == '3':
+        raise RuntimeError('the job died before page 3 was processed')
+      seen += page
+
+  crm = offline_crm(FakeSession(pages=5))
+  for page in crm.yield_page_from_module('Contacts',
+                                         checkpoint=Checkpoint(path)):
+    seen += page
+  assert [r['id'] for r in seen] == ['1', '2', '3', '4', '5']
+  assert crm.requests_session.requested == [3, 4, 5]
+
+  checkpoint = Checkpoint(path)
+  assert checkpoint.done
+  assert not list(crm.yield_page_from_module('Contacts', checkpoint=checkpoint))
+
+
+def test_checkpoint_belongs_to_one_run(tmp_path):
+  path = tmp_path / 'deals.json'
+  modified_since = datetime(2019, 5, 1, tzinfo=timezone.utc)
+  crm = offline_crm(FakeSession(pages=1))
+  list(crm.yield_page_from_module('Deals', modified_since=modified_since,
+                                  checkpoint=Checkpoint(path)))
+  assert Checkpoint(path).modified_since == modified_since.isoformat()
+  with pytest.raises(ValueError):
+    list(crm.yield_page_from_module('Deals', checkpoint=Checkpoint(path)))
+  assert list(tmp_path.iterdir()) == [path]
+
+
+def test_each_page_uses_the_current_token():
+  session = FakeSession(pages=3)
+  crm = offline_crm(session)
+  for page in crm.yield_page_from_module('Contacts'):
+    crm.current_token = {'access_token': f"refreshed-{page[0]['id']}"}
+  assert session.tokens == ['Zoho-oauthtoken token',
+                            'Zoho-oauthtoken refreshed-1',
+                            'Zoho-oauthtoken refreshed-2']
@@ -0,0 +1,62 @@
+""" Request coalescing, against a stand-in for the requests session."""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from zoho_crm_connector.tests.fakes import FakeResponse, offline_crm
+
+
+class SlowSession:
+  """ Holds every GET until release is set, then answers with `status_code`."""
+
+  def __init__(self, status_code=200):
+    self.status_code = status_code
+    self.release = threading.Event()
+    self.urls = []
+
+  def get(self, url, headers, params=None, timeout=None):
+    self.urls.append(url)
+    self.release.wait(5)
+    return FakeResponse(self.status_code, {'data': [{'id': url[-1]}]})
+
+
+def wait_for_callers(crm):
+  while True:
+    with crm._single_flight._lock:
+      if crm._single_flight._calls:
+        break
+  # the other callers block on the future of the call in flight
+  threading.Event().wait(0.05)
+
+
+def test_identical_gets_share_one_call():
+  session = SlowSession()
+  crm = offline_crm(session)
+  with ThreadPoolExecutor(9) as executor:
+    futures = [executor.submit(crm.get_record_by_id, 'Contacts', '1')
+               for _ in range(8)]
+    futures.append(executor.submit(crm.get_record_by_id, 'Contacts', '2'))
+    wait_for_callers(crm)
+    session.release.set()
+    records = [f.result() for f in futures]
+  assert records[:8] == [{'id': '1'}] * 8
+  assert records[8] == {'id': '2'}
+  assert sorted(session.urls) == [
+      'https://example.com/crm/v2/Contacts/1',
+      'https://example.com/crm/v2/Contacts/2'
+  ]
+  assert len({id(r) for r in records[:8]}) == 8, "callers share a result dict"
+
+
+def test_errors_are_shared():
+  session = SlowSession(status_code=500)
+  crm = offline_crm(session)
+  with ThreadPoolExecutor(4) as executor:
+    futures = [executor.submit(crm.get_record_by_id, 'Contacts', '1')
+               for _ in range(4)]
+    wait_for_callers(crm)
+    session.release.set()
+    for future in futures:
+      with pytest.raises(RuntimeError):
+        future.result()
+  assert not crm._single_flight._calls
@@ -0,0 +1,48 @@
+""" json codecs and request compression, against a stand-in for the requests session."""
+
+import gzip
+import json
+import pytest
+from zoho_crm_connector.codec import JsonCodec, default_codec
+from zoho_crm_connector.tests.fakes import FakeResponse, offline_crm
+
+
+class PostSession:
+  """ Keeps the last POST; answers like the API does to an insert."""
+
+  def __init__(self):
+    self.data = self.headers = None
+
+  def post(self, url, headers, data, timeout):
+    self.headers, self.data = headers, data
+    return FakeResponse(
+        200, {'data': [{'status': 'success', 'details': {'id': '1'}}]},
+        headers={'Content-Encoding': 'gzip', 'Content-Length': '40'})
+
+
+@pytest.mark.parametrize('codec', [JsonCodec(), default_codec()])
+def test_codec_round_trip(codec):
+  record = {'id': '1', 'Account_Name': {'name': 'Ä (B)', 'id': '2'},
+            'Amount': 1.5, 'Tag': [], 'Email_Opt_Out': False}
+  assert codec.loads(codec.dumps(record)) == record
+  assert json.loads(codec.dumps(record)) == record
+
+
+def test_large_bodies_are_compressed():
+  session = PostSession()
+  crm = offline_crm(session, json_codec=JsonCodec(), compress_requests_over=100)
+  small = {'data': [{'Last_Name': 'A'}]}
+  crm.bulk_upsert_zoho_module('Contacts', small)
+  assert 'Content-Encoding' not in session.headers
+  assert json.loads(session.data) == small
+
+  large = {'data': [{'Last_Name': 'A' * 200}]}
+  success, reply = crm.bulk_upsert_zoho_module('Contacts', large)
+  assert success and reply['data'][0]['details']['id'] == '1'
+  assert session.headers['Content-Encoding'] == 'gzip'
+  assert session.headers['Content-Type'] == 'application/json'
+  assert json.loads(gzip.decompress(session.data)) == large
+
+  stats = crm.transfer_stats.as_dict()
+  assert stats['responses'] == 2 and stats['compressed_responses'] == 2
+  assert stats['wire_bytes'] == 80
@@ -0,0 +1,176 @@
+""" Arrow record batches are built locally: no Zoho connection is needed."""
+
+import json
+import subprocess
+import sys
+import urllib.parse
+from datetime import date, datetime, timezone
+import pytest
+from zoho_crm_connector.tests.fakes import (FIELDS, FakeResponse, contact,
+                                            offline_crm)
+
+pa = pytest.importorskip('pyarrow')
+from zoho_crm_connector.columnar import (RecordBatchBuilder, read_table,
+                                         yield_record_batches)
+
+
+def numeric_contact(record_id):
+  """ A contact with numbers sent as json numbers, which Arrow converts in one go."""
+  return dict(contact(record_id), Annual_Spend=1234.5, Number_Of_Staff=12)
+
+
+class PagesSession:
+  """ Serves the field metadata and fixed pages of records."""
+
+  def __init__(self, pages, fields=FIELDS):
+    self.pages = pages
+    self.fields = fields
+
+  def get(self, url, headers=None, params=None, timeout=None):
+    if url.endswith('settings/fields'):
+      return FakeResponse(200, {'fields': self.fields})
+    page = int(dict(urllib.parse.parse_qsl(params))['page'])
+    if page > len(self.pages):
+      return FakeResponse(204)
+    return FakeResponse(200, {
+        'data': self.pages[page - 1],
+        'info': {'more_records': page < len(self.pages), 'page': page}
+    })
+
+
+def test_typed_columns():
+  batch = RecordBatchBuilder(FIELDS).build([contact('1'), contact('2')])
+  schema = batch.schema
+  assert schema.field('Number_Of_Staff').type == pa.int64()
+  assert schema.field('Annual_Spend').type == pa.float64()
+  assert schema.field('Date_of_Birth').type == pa.date32()
+  assert schema.field('Email_Opt_Out').type == pa.bool_()
+  assert schema.field('Tag').type == pa.list_(pa.string())
+  assert '$approved' not in schema.names  # not a module field
+  row = batch.to_pylist()[0]
+  assert row['id'] == '1'
+  assert row['Owner_id'] == '100'
+  assert row['Account_Name_name'] == 'GrowthPath Pty Ltd'
+  assert row['Date_of_Birth'] == date(1980, 5, 17)
+  assert row['Modified_Time'] == datetime(2019, 5, 1, 0, 0, tzinfo=timezone.utc)
+  assert row['Annual_Spend'] == 1234.5
+  assert row['Number_Of_Staff'] == 12
+  assert row['Tag'] == ['a', 'b']
+
+
+def test_missing_values_are_null():
+  record = {'id': '3', 'Owner': None, 'Number_Of_Staff': None}
+  row = RecordBatchBuilder(FIELDS).build([record]).to_pylist()[0]
+  assert row['Owner_id'] is None
+  assert row['Number_Of_Staff'] is None
+  assert row['Last_Name'] is None
+
+
+def test_structured_values_become_json():
+  tags = [{'name': 'vip', 'id': '9'}]
+  record = dict(contact('1'), Last_Name=tags, Tag=[{'name': 'a'}, 'b'])
+  row = RecordBatchBuilder(FIELDS).build([record]).to_pylist()[0]
+  assert json.loads(row['Last_Name']) == tags
+  assert [json.loads(row['Tag'][0]), row['Tag'][1]] == [{'name': 'a'}, 'b']
+
+
+def test_inferred_types():
+  page = [dict(contact('1'), Approval={'delegate': False})]
+  schema = RecordBatchBuilder().build(page).schema
+  assert schema.field('Modified_Time').type == pa.timestamp('s', tz='UTC')
+  assert schema.field('Date_of_Birth').type == pa.date32()
+  assert schema.field('Number_Of_Staff').type == pa.string()  # maybe an id
+  assert 'Owner_name' in schema.names
+  assert pa.types.is_struct(schema.field('Approval').type)
+
+
+def test_fractions_widen_an_inferred_integer_column():
+  builder = RecordBatchBuilder()
+  first = builder.build([{'id': '1', 'Amount': 10}])
+  second = builder.build([{'id': '2', 'Amount': 10.75}])
+  assert first.schema.field('Amount').type == pa.int64()
+  assert second.column('Amount').to_pylist() == [10.75]
+  assert builder.conform(first).column('Amount').to_pylist() == [10.0]
+
+
+def test_fractions_in_an_integer_field_are_an_error():
+  with pytest.raises(pa.ArrowInvalid):
+    RecordBatchBuilder(FIELDS).build([dict(contact('1'), Number_Of_Staff=10.75)])
+
+
+def test_a_lookup_after_nulls_becomes_a_lookup():
+  builder = RecordBatchBuilder()
+  first = builder.build([{'id': '1', 'Account_Name': None}])
+  second = builder.build([{'id': '2', 'Account_Name': {'id': '5', 'name': 'A'}}])
+  assert second.to_pylist() == [{'id': '2', 'Account_Name_id': '5',
+                                 'Account_Name_name': 'A'}]
+  assert builder.conform(first).to_pylist() == [{'id': '1', 'Account_Name_id': None,
+                                                 'Account_Name_name': None}]
+
+
+def test_new_fields_are_added():
+  builder = RecordBatchBuilder()
+  builder.build([{'id': '1'}])
+  second = builder.build([{'id': '2', 'Phone': '555'}])
+  assert second.column('Phone').to_pylist() == ['555']
+
+
+def test_contradicting_values_are_an_error():
+  builder = RecordBatchBuilder()
+  builder.build([{'id': '1', 'Account_Name': {'id': '5', 'name': 'A'}}])
+  with pytest.raises(RuntimeError, match='Account_Name'):
+    builder.build([{'id': '2', 'Account_Name': 'A'}])
+
+
+def test_read_table_conforms_widened_batches():
+  pages = [[{'id': '1', 'Amount': 10, 'Owner': None}],
+           [{'id': '2', 'Amount': 10.75, 'Owner': {'id': '7', 'name': 'T'},
+             'Phone': '555'}]]
+  table = read_table(offline_crm(PagesSession(pages)), 'Contacts',
+                     use_field_metadata=False)
+  assert table.to_pylist() == [
+      {'id': '1', 'Amount': 10.0, 'Owner_id': None, 'Owner_name': None,
+       'Phone': None},
+      {'id': '2', 'Amount': 10.75, 'Owner_id': '7', 'Owner_name': 'T',
+       'Phone': '555'},
+  ]
+
+
+def test_one_batch_per_page():
+  pages = [[numeric_contact('1'), numeric_contact('2')], [numeric_contact('3')],
+           [contact('4')]]  # numbers as strings: built column by column
+  crm = offline_crm(PagesSession(pages))
+  batches = list(yield_record_batches(crm, 'Contacts'))
+  assert [b.num_rows for b in batches] == [2, 1, 1]
+  assert all(b.schema == batches[0].schema for b in batches)
+  assert batches[0].column('Modified_Time').to_pylist()[0] == datetime(
+      2019, 5, 1, 0, 0, tzinfo=timezone.utc)
+  assert batches[2].column('Number_Of_Staff').to_pylist() == [12]
+  assert crm.transfer_stats.responses == 4
+
+
+def test_inferred_schema_is_kept():
+  pages = [[numeric_contact('1')], [dict(numeric_contact('2'),
+                                         Number_Of_Staff=None)]]
+  crm = offline_crm(PagesSession(pages))
+  batches = list(
+      yield_record_batches(crm, 'Contacts', use_field_metadata=False))
+  assert batches[0].schema == batches[1].schema
+  assert batches[1].column('Number_Of_Staff').to_pylist() == [None]
+
+
+def test_read_table():
+  crm = offline_crm(PagesSession([[contact('1'), contact('2')],
+                                  [numeric_contact('3')]]))
+  table = read_table(crm, 'Contacts')
+  assert table.num_rows == 3
+  assert table.column('id').to_pylist() == ['1', '2', '3']
+  assert read_table(offline_crm(PagesSession([])), 'Contacts').num_rows == 0
+
+
+def test_package_import_does_not_load_pyarrow():
+  loaded = subprocess.run(
+      [sys.executable, '-c',
+       'import sys, zoho_crm_connector; print("pyarrow" in sys.modules)'],
+      check=True, capture_output=True, text=True).stdout.strip()
+  assert loaded == 'False'
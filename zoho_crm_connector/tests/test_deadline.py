@@ -0,0 +1,119 @@
+""" Timeouts, deadlines and hedged GETs, against a stand-in for the requests session."""
+
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+import urllib3
+from zoho_crm_connector.tests.fakes import FakeResponse, offline_crm
+from zoho_crm_connector.zoho_crm_api import (_DEADLINE, DeadlineExceeded,
+                                             _DeadlineRetry)
+
+
+class TimedSession:
+  """ Answers GETs after the delays in `delays` (one per call, the last one repeats)."""
+
+  def __init__(self, *delays):
+    self.delays = list(delays)
+    self.timeouts = []
+    self.lock = threading.Lock()
+
+  def get(self, url, headers, params=None, timeout=None):
+    with self.lock:
+      self.timeouts.append(timeout)
+      delay = self.delays.pop(0) if len(self.delays) > 1 else self.delays[0]
+    time.sleep(delay)
+    return FakeResponse(200, {'data': [{'id': '1', 'delay': delay}]})
+
+
+def test_timeouts_are_passed():
+  session = TimedSession(0)
+  crm = offline_crm(session, timeout=(3, 30))
+  crm.get_record_by_id('Contacts', '1')
+  assert session.timeouts == [(3, 30)]
+
+
+def test_timeouts_are_shortened_by_the_deadline():
+  session = TimedSession(0)
+  crm = offline_crm(session, timeout=(3, 30), deadline=2)
+  crm.get_record_by_id('Contacts', '1')
+  connect, read = session.timeouts[0]
+  assert 1 < connect <= 2 and 1 < read <= 2
+  assert getattr(_DEADLINE, 'deadline') is None
+
+
+class Unavailable(BaseHTTPRequestHandler):
+  """ Always 503, so that urllib3 retries the status."""
+
+  def do_GET(self):
+    self.send_response(503)
+    self.send_header('Content-Length', '2')
+    self.end_headers()
+    self.wfile.write(b'no')
+
+  def log_message(self, *args):
+    pass
+
+
+def test_retry_gives_up_at_the_deadline():
+  retry = _DeadlineRetry(total=10, backoff_factor=2,
+                         status_forcelist=(503,))
+  server = HTTPServer(('127.0.0.1', 0), Unavailable)
+  thread = threading.Thread(target=server.serve_forever, daemon=True)
+  thread.start()
+  pool = urllib3.HTTPConnectionPool('127.0.0.1', server.server_port,
+                                    maxsize=1, block=True, retries=retry)
+  _DEADLINE.deadline = time.monotonic() - 1
+  try:
+    retry.increment(method='GET', url='/')  # gives up only in sleep
+    with pytest.raises(DeadlineExceeded):
+      retry.sleep()
+    with pytest.raises(DeadlineExceeded):
+      pool.urlopen('GET', '/', preload_content=False)  # as requests does
+    # the retried response was drained and its connection returned
+    assert pool.pool.qsize() == 1
+  finally:
+    _DEADLINE.deadline = None
+    pool.close()
+    server.shutdown()
+    server.server_close()
+
+
+def test_shared_request_respects_the_deadline():
+  session = TimedSession(0.5)
+  crm = offline_crm(session, deadline=0.2)
+
+  def leader():
+    # a longer deadline of its own: it is not replaced by the client's
+    _DEADLINE.deadline = time.monotonic() + 10
+    crm.get_record_by_id('Contacts', '1')
+
+  thread = threading.Thread(target=leader)
+  thread.start()
+  time.sleep(0.05)
+  with pytest.raises(DeadlineExceeded):
+    crm.get_record_by_id('Contacts', '1')
+  thread.join()
+  assert len(session.timeouts) == 1
+
+
+def test_slow_get_is_hedged():
+  session = TimedSession(*([0.01] * 20 + [2, 0.01]))
+  crm = offline_crm(session, hedge_percentile=90, coalesce_requests=False)
+  for _ in range(20):
+    crm.get_record_by_id('Contacts', '1')
+  start = time.monotonic()
+  record = crm.get_record_by_id('Contacts', '1')
+  assert time.monotonic() - start < 1
+  assert record['delay'] == 0.01
+  assert len(session.timeouts) == 22
+
+
+def test_hedging_falls_back_to_a_plain_get_after_shutdown():
+  session = TimedSession(0)
+  crm = offline_crm(session, hedge_percentile=90, coalesce_requests=False)
+  for _ in range(20):
+    crm.get_record_by_id('Contacts', '1')
+  crm._hedge_executor.shutdown()
+  assert crm.get_record_by_id('Contacts', '1')['id'] == '1'
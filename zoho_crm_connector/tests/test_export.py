@@ -0,0 +1,127 @@
+""" Sharded exports against a stand-in for the API, which is served in every worker process."""
+
+import re
+import urllib.parse
+from datetime import datetime, timedelta, timezone
+
+from zoho_crm_connector.export import (Partition, export_module,
+                                       plan_partitions, yield_exported_pages)
+from zoho_crm_connector.tests.fakes import FakeResponse, offline_crm
+
+TZ = timezone(timedelta(hours=10))
+START = datetime(2020, 1, 1, tzinfo=TZ)
+NOW = datetime(2020, 3, 1, tzinfo=timezone.utc)
+
+
+def make_contacts(n=5000):
+  """ Most contacts were created in one busy day, so that equal ranges don't fit."""
+  contacts = []
+  for i in range(n):
+    created = (START + timedelta(seconds=7 * i) if i % 10 else
+               START + timedelta(days=i % 50))
+    contacts.append({'id': str(i), 'Created_Time': created.isoformat()})
+  return contacts
+
+
+class ModuleSession:
+  """ Lists, sorts and searches (by Created_Time range) a list of records,
+        and like Zoho, a search can't page past the first 2,000 records."""
+
+  def __init__(self, records):
+    self.records = records
+
+  def get(self, url, headers=None, params=None, timeout=None):
+    if isinstance(params, str):
+      params = dict(urllib.parse.parse_qsl(params))
+    per_page, page = int(params.get('per_page', 200)), int(params['page'])
+    records = self.records
+    if url.endswith('/search'):
+      if page * per_page > 2000:
+        return FakeResponse(400, {'code': 'LIMIT_REACHED'})
+      for field, operator, value in re.findall(r'\((\w+):(\w+):([^()]+)\)',
+                                               params['criteria']):
+        bound = datetime.fromisoformat(value)
+        records = [
+            r for r in records
+            if (datetime.fromisoformat(r[field]) >= bound) == (
+                operator == 'greater_equal')
+        ]
+    if params.get('sort_by'):
+      records = sorted(records,
+                       key=lambda r: datetime.fromisoformat(r[params['sort_by']]))
+    data = records[(page - 1) * per_page:page * per_page]
+    if not data:
+      return FakeResponse(204)
+    return FakeResponse(200, {
+        'data': data,
+        'info': {'more_records': len(records) > page * per_page}
+    })
+
+
+def contacts_client():
+  return offline_crm(ModuleSession(make_contacts()))
+
+
+def test_partitions_fit():
+  partitions = plan_partitions(contacts_client(), 'Contacts', now=NOW)
+  assert partitions[0].start == START
+  assert partitions[-1].end is None
+  for before, after in zip(partitions, partitions[1:]):
+    assert before.end == after.start
+  contacts = make_contacts()
+  sizes = [
+      sum(1 for c in contacts
+          if p.start <= datetime.fromisoformat(c['Created_Time']) and
+          (p.end is None or datetime.fromisoformat(c['Created_Time']) < p.end))
+      for p in partitions
+  ]
+  assert sum(sizes) == len(contacts)
+  assert max(sizes) <= 2000
+  assert all(p.complete for p in partitions)
+
+
+def test_partition_criteria():
+  partition = Partition(START, START + timedelta(hours=1))
+  assert partition.criteria('Created_Time') == (
+      '((Created_Time:greater_equal:2020-01-01T00:00:00+10:00)and'
+      '(Created_Time:less_than:2020-01-01T01:00:00+10:00))')
+  assert Partition(START, START + timedelta(seconds=1)).halves(NOW) is None
+
+
+def test_export_module(tmp_path):
+  result = export_module(contacts_client, 'Contacts', tmp_path, max_workers=2)
+  assert result.records == 5000
+  assert all(path.exists() for path in result.paths)
+  ids = [r['id'] for page in yield_exported_pages(result.paths) for r in page]
+  assert sorted(ids, key=int) == [str(i) for i in range(5000)]
+  assert result.incomplete == []
+
+
+def busy_second_contacts():
+  """ More contacts created in one second than a search can read."""
+  return make_contacts(1000) + [{
+      'id': str(1000 + i), 'Created_Time': START.isoformat()
+  } for i in range(2500)]
+
+
+def busy_second_client():
+  return offline_crm(ModuleSession(busy_second_contacts()))
+
+
+def test_incomplete_partition_is_reported(tmp_path):
+  result = export_module(busy_second_client, 'Contacts', tmp_path,
+                         max_workers=2)
+  assert [(p.start, p.end) for p in result.incomplete
+         ] == [(START, START + timedelta(seconds=1))]
+  assert not result.incomplete[0].complete
+  contacts = busy_second_contacts()
+  in_second = sum(1 for c in contacts if c['Created_Time'] == START.isoformat())
+  assert result.records == len(contacts) - in_second + 2000
+
+
+def test_merge_keeps_first_copy(tmp_path):
+  newer, older = tmp_path / 'newer.jsonl', tmp_path / 'older.jsonl'
+  newer.write_text('{"id": "1", "v": 2}\n')
+  older.write_text('{"id": "1", "v": 1}\n{"id": "2", "v": 1}\n')
+  pages = list(yield_exported_pages([newer, older], page_size=1))
+  assert pages == [[{'id': '1', 'v': 2}], [{'id': '2', 'v': 1}]]
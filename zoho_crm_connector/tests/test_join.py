@@ -0,0 +1,43 @@
+""" Local joins: the modules are given as pages, no Zoho connection is needed."""
+
+import pytest
+from zoho_crm_connector.join import HashIndex, get_path, hash_join
+
+ACCOUNTS = [[{'id': 'a1', 'Account_Name': 'One'},
+             {'id': 'a2', 'Account_Name': 'Two'}]]
+CONTACTS = [[{'id': 'c1', 'Account_Name': {'name': 'One', 'id': 'a1'}},
+             {'id': 'c2', 'Account_Name': {'name': 'One', 'id': 'a1'}}],
+            [{'id': 'c3', 'Account_Name': None},
+             {'id': 'c4', 'Account_Name': {'name': 'Gone', 'id': 'a9'}}]]
+
+
+def test_get_path():
+  assert get_path(CONTACTS[0][0], 'Account_Name.id') == 'a1'
+  assert get_path(CONTACTS[1][0], 'Account_Name.id') is None
+
+
+@pytest.mark.parametrize('spill_threshold', [None, 1])
+def test_many_to_one(tmp_path, spill_threshold):
+  with HashIndex('id', spill_threshold=spill_threshold,
+                 spill_dir=tmp_path) as index:
+    index.add_pages(ACCOUNTS)
+    assert index.spilled == (spill_threshold is not None)
+    rows = list(
+        hash_join(CONTACTS, {'Accounts': index},
+                  on={'Accounts': 'Account_Name.id'},
+                  base_name='Contacts'))
+  assert [(r['Contacts']['id'], r['Accounts']['id']) for r in rows] == [
+      ('c1', 'a1'), ('c2', 'a1')]
+  assert not list(tmp_path.iterdir()), "spilled index was not removed"
+
+
+def test_one_to_many_left():
+  index = HashIndex('Account_Name.id')
+  index.add_pages(CONTACTS)
+  rows = list(
+      hash_join(ACCOUNTS, {'Contacts': index},
+                on={'Contacts': 'id'},
+                base_name='Accounts',
+                how='left'))
+  assert [(r['Accounts']['id'], r['Contacts'] and r['Contacts']['id'])
+          for r in rows] == [('a1', 'c1'), ('a1', 'c2'), ('a2', None)]
@@ -0,0 +1,109 @@
+""" The client manager, against a local HTTP server standing in for Zoho."""
+
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from zoho_crm_connector.manager import RateLimiter, ZohoCRMManager
+from zoho_crm_connector.token_store import SharedTokenStore
+
+
+class FakeZoho(BaseHTTPRequestHandler):
+  """ Answers every GET with one record, slowly, counting concurrent requests."""
+  lock = threading.Lock()
+  active = 0
+  max_active = 0
+
+  def do_GET(self):  # pylint: disable=invalid-name
+    with self.lock:
+      FakeZoho.active += 1
+      FakeZoho.max_active = max(FakeZoho.max_active, FakeZoho.active)
+    time.sleep(0.05)
+    with self.lock:
+      FakeZoho.active -= 1
+    body = json.dumps({'data': [{'id': '1'}], 'users': []}).encode()
+    self.send_response(200)
+    self.send_header('Content-Length', str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+  def log_message(self, *args):
+    pass
+
+
+@pytest.fixture
+def zoho_server():
+  server = ThreadingHTTPServer(('127.0.0.1', 0), FakeZoho)
+  thread = threading.Thread(target=server.serve_forever, daemon=True)
+  thread.start()
+  FakeZoho.max_active = 0
+  yield f'http://127.0.0.1:{server.server_address[1]}/'
+  server.shutdown()
+  server.server_close()
+
+
+def manager_for(base_url, tmp_path, **kwargs) -> ZohoCRMManager:
+  store = SharedTokenStore(tmp_path / 'tokens.json')
+  manager = ZohoCRMManager('client', 'secret', token_store=store,
+                           base_url=base_url, coalesce_requests=False, **kwargs)
+  for org in ('a', 'b', 'c'):
+    store.set(org, {'access_token': f'token-{org}'})
+    manager.add_org(org, refresh_token=f'refresh-{org}')
+  return manager
+
+
+def test_clients_share_a_pool_and_limits(zoho_server, tmp_path):
+  with manager_for(zoho_server, tmp_path, max_concurrent=3,
+                   max_concurrent_per_org=2) as manager:
+    assert manager['a'] is manager.get('a')
+    assert manager['a'].token_store.load() == {'access_token': 'token-a'}
+    adapters = {manager[org].requests_session.get_adapter('https://')
+                for org in ('a', 'b', 'c')}
+    assert len(adapters) == 1
+    FakeZoho.max_active = 0
+    with ThreadPoolExecutor(12) as executor:
+      list(executor.map(lambda org: manager[org].get_record_by_id('Deals', 1),
+                        ['a'] * 6 + ['b'] * 6))
+    assert FakeZoho.max_active == 3
+    FakeZoho.max_active = 0
+    with ThreadPoolExecutor(6) as executor:
+      list(executor.map(lambda org: manager[org].get_record_by_id('Deals', 1),
+                        ['a'] * 6))
+    assert FakeZoho.max_active == 2
+
+
+def test_least_recently_used_clients_are_evicted(zoho_server, tmp_path):
+  with manager_for(zoho_server, tmp_path, max_clients=2) as manager:
+    first_a = manager['a']
+    manager.get('b')
+    manager.get('a')
+    manager.get('c')
+    assert manager.clients == ['a', 'c']
+    assert manager['a'] is first_a
+    manager.get('b')
+    assert manager.clients == ['a', 'b']
+  with pytest.raises(KeyError):
+    manager.get('unknown')
+
+
+def test_evicted_client_stays_usable(zoho_server, tmp_path):
+  with manager_for(zoho_server, tmp_path, max_clients=1,
+                   hedge_percentile=95) as manager:
+    held = manager['a']
+    for _ in range(20):  # enough latencies to hedge
+      held.get_record_by_id('Deals', 1)
+    manager.get('b')
+    assert manager.clients == ['b']
+    assert held.get_record_by_id('Deals', 1) == {'id': '1'}
+    assert held._hedge_executor.submit(lambda: 1).result() == 1
+
+
+def test_rate_limiter():
+  limiter = RateLimiter(rate=20, burst=2)
+  start = time.monotonic()
+  for _ in range(6):
+    assert limiter.acquire()
+  assert time.monotonic() - start >= 0.15
+  assert not limiter.acquire(timeout=0)
@@ -0,0 +1,133 @@
+""" Notification channels and the receiver, without a Zoho connection."""
+
+import http.client
+import json
+import queue
+import urllib.request
+from datetime import datetime, timedelta, timezone
+import pytest
+from zoho_crm_connector.notifications import (ChangeEvent, NotificationChannels,
+                                              NotificationReceiver,
+                                              drain_changed_ids)
+
+
+class FakeCRM:
+
+  def __init__(self):
+    self.calls = []
+    self.fail_updates = 0
+
+  def enable_notifications(self, watch):
+    self.calls.append(('enable', watch))
+    return True, {}
+
+  def update_notifications(self, watch):
+    self.calls.append(('update', watch))
+    if self.fail_updates:
+      self.fail_updates -= 1
+      return False, {'code': 'INTERNAL_ERROR'}
+    return True, {}
+
+
+def post(receiver, body):
+  host, port = receiver.address
+  request = urllib.request.Request(
+      f'http://127.0.0.1:{port}/zoho/notifications',
+      data=json.dumps(body).encode(),
+      method='POST')
+  try:
+    return urllib.request.urlopen(request).status
+  except urllib.error.HTTPError as e:
+    return e.code
+
+
+def post_raw(receiver, body, content_length):
+  """ POST body with the given Content-Length header (none if None)."""
+  host, port = receiver.address
+  connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+  try:
+    connection.putrequest('POST', '/zoho/notifications')
+    if content_length is not None:
+      connection.putheader('Content-Length', content_length)
+    connection.endheaders(body)
+    return connection.getresponse().status
+  finally:
+    connection.close()
+
+
+def test_receiver_checks_content_length():
+  receiver = NotificationReceiver(host='127.0.0.1', port=0, max_body_bytes=100)
+  receiver.start()
+  try:
+    assert post_raw(receiver, b'{}', None) == 400
+    assert post_raw(receiver, b'{}', 'two') == 400
+    assert post_raw(receiver, b'{}', '-1') == 400
+    assert post_raw(receiver, b'x' * 101, '101') == 413
+    assert post_raw(receiver, b'{}', '2') == 400  # read, then found invalid
+  finally:
+    receiver.stop()
+  assert receiver.queue.empty()
+
+
+def test_receiver_checks_tokens():
+  receiver = NotificationReceiver(host='127.0.0.1', port=0)
+  crm = FakeCRM()
+  channels = NotificationChannels(crm, 'https://example.com/zoho/notifications',
+                                  tokens=receiver.tokens)
+  channel_id = channels.watch('Deals')
+  watch = crm.calls[0][1][0]
+  assert watch['events'] == ['Deals.all'] and len(watch['token']) <= 50
+  receiver.start()
+  try:
+    notification = {'channel_id': channel_id, 'token': watch['token'],
+                    'module': 'Deals', 'operation': 'update', 'ids': ['1', '2']}
+    assert post(receiver, notification) == 200
+    assert post(receiver, dict(notification, token='forged')) == 403
+    assert post(receiver, {'channel_id': channel_id}) == 400
+    assert post(receiver, dict(notification, token=12345)) == 400
+  finally:
+    receiver.stop()
+  assert receiver.queue.get_nowait() == ChangeEvent(
+      'Deals', 'update', ('1', '2'), channel_id)
+  assert receiver.queue.empty()
+
+
+def test_channels_are_renewed_before_expiry():
+  crm = FakeCRM()
+  channels = NotificationChannels(crm, 'https://example.com/',
+                                  lifetime=timedelta(hours=23),
+                                  renew_before=timedelta(hours=1))
+  channel_id = channels.watch('Contacts', operations=('create', 'edit'))
+  now = datetime.now(timezone.utc)
+  assert channels.renew_due(now + timedelta(hours=21)) == []
+  assert channels.renew_due(now + timedelta(hours=22, minutes=30)) == [
+      channel_id]
+  assert crm.calls[-1][0] == 'update'
+  with pytest.raises(ValueError):
+    NotificationChannels(crm, 'https://example.com/', lifetime=timedelta(days=2))
+
+
+def test_failed_renewal_is_retried():
+  crm = FakeCRM()
+  channels = NotificationChannels(crm, 'https://example.com/')
+  channel_id = channels.watch('Deals')
+  expiry = channels.channels[channel_id].expiry
+  due = datetime.now(timezone.utc) + timedelta(hours=22, minutes=30)
+  crm.fail_updates = 1
+  with pytest.raises(RuntimeError):
+    channels.renew_due(due)
+  assert channels.channels[channel_id].expiry == expiry
+  assert channels.renew_due(due + timedelta(minutes=1)) == [channel_id]
+  assert channels.channels[channel_id].expiry > expiry
+
+
+def test_drain_merges_ids():
+  events = queue.Queue()
+  events.put(ChangeEvent('Deals', 'update', ('1', '2'), 'c'))
+  events.put(ChangeEvent('Deals', 'update', ('2', '3'), 'c'))
+  events.put(ChangeEvent('Deals', 'delete', ('1',), 'c'))
+  assert drain_changed_ids(events, wait=0.1) == {
+      ('Deals', 'update'): ['1', '2', '3'],
+      ('Deals', 'delete'): ['1'],
+  }
+  assert drain_changed_ids(events, wait=0.01) == {}
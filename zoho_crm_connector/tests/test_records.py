@@ -0,0 +1,40 @@
+""" Compact records are decoded locally: no Zoho connection is needed."""
+
+from datetime import date, datetime, timedelta, timezone
+import pytest
+from zoho_crm_connector.records import Lookup, make_record_type
+from zoho_crm_connector.tests.fakes import FIELDS, contact
+
+
+def test_decode_types():
+  Contact = make_record_type('Contacts', FIELDS)
+  c = Contact.from_dict(contact('1'))
+  assert c.id == '1'
+  assert c.Account_Name == Lookup(id='200', name='GrowthPath Pty Ltd')
+  assert c.Owner.name == 'Tim Richardson'
+  assert c.Date_of_Birth == date(1980, 5, 17)
+  assert c.Modified_Time == datetime(
+      2019, 5, 1, 10, tzinfo=timezone(timedelta(hours=10)))
+  assert c.Email_Opt_Out is False
+  assert c.Annual_Spend == 1234.5
+  assert c.Number_Of_Staff == 12
+  assert c.Tag == ('a', 'b')
+  assert c['Last_Name'] == 'Richardson'
+  with pytest.raises(AttributeError):
+    c.__dict__  # pylint: disable=pointless-statement
+
+
+def test_missing_and_unknown_fields():
+  Contact = make_record_type('Contacts', FIELDS)
+  c = Contact.from_dict({'id': '1'})
+  assert c.Owner is None
+  assert '$approved' not in c.as_dict()
+
+
+def test_repeated_values_are_shared():
+  Contact = make_record_type('Contacts', FIELDS)
+  # build the strings at run time so they are distinct objects before decoding
+  a = Contact.from_dict(contact('1', owner_name=''.join(['Tim ', 'R'])))
+  b = Contact.from_dict(contact('2', owner_name=''.join(['Tim ', 'R'])))
+  assert a.Owner is b.Owner
+  assert a.Lead_Source is b.Lead_Source
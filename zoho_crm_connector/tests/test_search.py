@@ -0,0 +1,103 @@
+""" Search planning is local; the searches run against a stand-in for ZohoCRM."""
+
+import threading
+
+import pytest
+
+from zoho_crm_connector.search import (AnyOf, criteria_strings, plan_search,
+                                       search_module)
+
+
+class FakeCRM:
+  """ Answers criteria searches from a list of accounts, per_page records a page."""
+
+  def __init__(self, accounts, per_page=200):
+    self.accounts = accounts
+    self.per_page = per_page
+    self.calls = []
+
+  def yield_page_from_module(self, module_name, criteria=None, parameters=None):
+    self.calls.append(criteria)
+    found = self.accounts if criteria is None else [
+        a for a in self.accounts if f":{a['Account_Name']})" in criteria
+    ]
+    for i in range(0, len(found), self.per_page):
+      yield found[i:i + self.per_page]
+
+
+class SlowCRM(FakeCRM):
+  """ Doesn't fetch the second page of a search until release is set."""
+
+  def __init__(self, accounts, per_page):
+    super().__init__(accounts, per_page)
+    self.release = threading.Event()
+    self.released = []
+
+  def yield_page_from_module(self, module_name, criteria=None, parameters=None):
+    for number, page in enumerate(
+        super().yield_page_from_module(module_name, criteria, parameters)):
+      if number:
+        self.released.append(self.release.wait(5))
+      yield page
+
+
+def test_criteria_strings():
+  names = [f'n{i}' for i in range(25)] + ['n0', 'A (B), C']
+  strings = criteria_strings(AnyOf('Account_Name', names))
+  assert len(strings) == 3
+  assert strings[0].startswith('((Account_Name:equals:n0)or(')
+  assert strings[2].endswith(r'(Account_Name:equals:A \(B\)\, C))')
+
+
+def test_plan_search():
+  names = AnyOf('Account_Name', [str(i) for i in range(3000)])
+  assert plan_search(names) == 'search'
+  assert plan_search(names, estimated_records=1000000) == 'search'
+  assert plan_search(names, estimated_records=20000) == 'scan'
+  prefixes = AnyOf('Account_Name', [str(i) for i in range(3000)], 'starts_with')
+  assert plan_search(prefixes, estimated_records=100000) == 'search'
+  assert plan_search(prefixes, estimated_records=100000,
+                     matches_per_value=50) == 'scan'  # 3 pages a search
+
+
+def test_search_module_deduplicates():
+  accounts = [{'id': str(i), 'Account_Name': f'n{i}'} for i in range(30)]
+  crm = FakeCRM(accounts)
+  names = AnyOf('Account_Name', [f'n{i}' for i in range(0, 30, 2)] * 2)
+  found = [r['id'] for page in search_module(crm, 'Accounts', names)
+           for r in page]
+  assert sorted(found, key=int) == [str(i) for i in range(0, 30, 2)]
+  assert len(crm.calls) == 2
+
+
+def test_search_module_scans():
+  accounts = [{'id': str(i), 'Account_Name': f'N{i}'} for i in range(30)]
+  crm = FakeCRM(accounts)
+  names = AnyOf('Account_Name', [f'n{i}' for i in range(25)])
+  found = [r['id'] for page in search_module(
+      crm, 'Accounts', names, estimated_records=30) for r in page]
+  assert found == [str(i) for i in range(25)]
+  assert crm.calls == [None]
+
+
+def test_pages_are_yielded_as_they_arrive():
+  accounts = [{'id': str(i), 'Account_Name': 'n'} for i in range(5)]
+  crm = SlowCRM(accounts, per_page=2)
+  pages = search_module(crm, 'Accounts', AnyOf('Account_Name', ['n']))
+  assert [r['id'] for r in next(pages)] == ['0', '1']
+  crm.release.set()
+  assert [r['id'] for page in pages for r in page] == ['2', '3', '4']
+  assert crm.released == [True, True]
+
+
+def test_search_errors_are_raised():
+
+  class FailingCRM(FakeCRM):
+
+    def yield_page_from_module(self, module_name, criteria=None,
+                               parameters=None):
+      raise RuntimeError('search failed')
+      yield  # pylint: disable=unreachable
+
+  with pytest.raises(RuntimeError):
+    list(search_module(FailingCRM([]), 'Accounts', AnyOf('Account_Name', ['n'])))
@@ -0,0 +1,101 @@
+""" The buffered writer, against a stand-in for ZohoCRM."""
+
+import threading
+import pytest
+from zoho_crm_connector.writer import BufferedWriter
+
+
+class FakeCRM:
+  """ Records the batches written; emails containing 'bad' fail."""
+
+  def __init__(self):
+    self.batches = []
+    self.lock = threading.Lock()
+
+  def _reply(self, kind, payload):
+    with self.lock:
+      self.batches.append((kind, [dict(r) for r in payload['data']]))
+    return True, {'data': [{
+        'status': 'error' if 'bad' in r.get('Email', '') else 'success',
+        'details': {'id': r.get('id', 'new')}
+    } for r in payload['data']]}
+
+  def update_zoho_module(self, module_name, payload):
+    return self._reply('update', payload)
+
+  def bulk_upsert_zoho_module(self, module_name, payload,
+                              duplicate_check_fields=None):
+    assert duplicate_check_fields == ['Email']
+    return self._reply('upsert', payload)
+
+
+def test_changes_are_merged_and_batched():
+  crm = FakeCRM()
+  with BufferedWriter(crm, 'Contacts', duplicate_key='Email',
+                      max_age=60) as writer:
+    first = writer.submit({'Email': 'a@x.com', 'Last_Name': 'A'})
+    second = writer.submit({'Email': 'a@x.com', 'Phone': '1'})
+    by_id = writer.submit({'id': '7', 'Last_Name': 'B'})
+    bad = writer.submit({'Email': 'bad@x.com'})
+    assert writer.flush(timeout=5)
+  assert first.result() is second.result()
+  assert by_id.result()['details']['id'] == '7'
+  with pytest.raises(RuntimeError):
+    bad.result()
+  assert sorted(crm.batches) == [
+      ('update', [{'id': '7', 'Last_Name': 'B'}]),
+      ('upsert', [{'Email': 'a@x.com', 'Last_Name': 'A', 'Phone': '1'},
+                  {'Email': 'bad@x.com'}]),
+  ]
+
+
+def test_full_batches_are_written_without_flush():
+  crm = FakeCRM()
+  writer = BufferedWriter(crm, 'Contacts', duplicate_key='Email',
+                          batch_size=10, max_age=60, max_pending=10)
+  futures = [writer.submit({'Email': f'{i}@x.com'}) for i in range(25)]
+  for future in futures[:20]:
+    future.result(timeout=5)
+  writer.close()
+  assert [len(records) for _, records in crm.batches] == [10, 10, 5]
+  assert all(f.done() for f in futures)
+
+
+def test_cancelled_changes_are_not_written():
+  crm = FakeCRM()
+  with BufferedWriter(crm, 'Contacts', duplicate_key='Email',
+                      max_age=60) as writer:
+    cancelled = writer.submit({'Email': 'a@x.com'})
+    kept = writer.submit({'Email': 'b@x.com'})
+    assert cancelled.cancel()
+    assert writer.flush(timeout=5)
+    assert kept.result()['status'] == 'success'
+    assert not kept.cancel()  # too late once written
+    later = writer.submit({'Email': 'c@x.com'})  # the writer is still running
+    assert writer.flush(timeout=5)
+    assert later.result()['status'] == 'success'
+  assert crm.batches == [('upsert', [{'Email': 'b@x.com'}]),
+                         ('upsert', [{'Email': 'c@x.com'}])]
+
+
+def test_a_failed_batch_does_not_stop_the_writer():
+
+  class MalformedCRM(FakeCRM):
+    """ The first reply has strings instead of results."""
+
+    def _reply(self, kind, payload):
+      if not self.batches:
+        self.batches.append((kind, payload['data']))
+        return True, {'data': ['unexpected']}
+      return super()._reply(kind, payload)
+
+  crm = MalformedCRM()
+  with BufferedWriter(crm, 'Contacts', duplicate_key='Email',
+                      max_age=60) as writer:
+    failed = writer.submit({'Email': 'a@x.com'})
+    writer.flush(timeout=5)
+    with pytest.raises(AttributeError):
+      failed.result(timeout=5)
+    later = writer.submit({'Email': 'b@x.com'})
+    assert writer.flush(timeout=5)
+    assert later.result()['status'] == 'success'
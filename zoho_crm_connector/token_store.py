@@ -0,0 +1,92 @@
+"""
+zoho_crm_connector.token_store
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Where ZohoCRM keeps its short-lived access token.
+
+By default each ZohoCRM writes its token to access_token.json in token_file_dir (FileTokenStore).
+A SharedTokenStore keeps the tokens of many organisations in one file (or only in memory),
+keyed by organisation; see zoho_crm_connector.manager.
+
+A token store is any object with load() -> Optional[dict] and save(token: dict).
+"""
+
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+
+def _write_json_atomically(path: Path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(
+        prefix=path.name, suffix=".tmp", dir=str(path.parent))
+    try:
+        with os.fdopen(fd, "w") as tmp_file:
+            json.dump(data, tmp_file)
+        os.replace(tmp_name, str(path))
+    except BaseException:
+        os.remove(tmp_name)
+        raise
+
+
+class FileTokenStore:
+    """ One access token in a json file, rewritten atomically
+            (processes sharing the file never read half a token)."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+    def load(self) -> Optional[dict]:
+        try:
+            with self.path.open() as data_file:
+                return json.load(data_file)
+        except (ValueError, FileNotFoundError, IOError):
+            return None
+
+    def save(self, token: dict):
+        _write_json_atomically(self.path, token)
+
+
+class SharedTokenStore:
+    """ The access tokens of many organisations, keyed by organisation.
+            With a path, the tokens are kept in one json file which is rewritten atomically
+            on every change; without one, they only live in memory."""
+
+    def __init__(self, path: Path = None):
+        self.path = Path(path) if path else None
+        self._lock = threading.Lock()
+        self._tokens = {}  # type: Dict[str, dict]
+        if self.path and self.path.exists():
+            with self.path.open() as data_file:
+                self._tokens = json.load(data_file)
+
+    def get(self, org: str) -> Optional[dict]:
+        with self._lock:
+            return self._tokens.get(org)
+
+    def set(self, org: str, token: dict):
+        with self._lock:
+            self._tokens[org] = token
+            if self.path:
+                _write_json_atomically(self.path, self._tokens)
+
+    def for_org(self, org: str) -> "OrgTokenStore":
+        """ The token store of one organisation, to pass to ZohoCRM(token_store=...)."""
+        return OrgTokenStore(self, org)
+
+
+class OrgTokenStore:
+    """ One organisation's view of a SharedTokenStore."""
+
+    def __init__(self, shared: SharedTokenStore, org: str):
+        self.shared = shared
+        self.org = org
+
+    def load(self) -> Optional[dict]:
+        return self.shared.get(self.org)
+
+    def save(self, token: dict):
+        self.shared.set(self.org, token)
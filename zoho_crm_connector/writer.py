@@ -0,0 +1,226 @@
+"""
+zoho_crm_connector.writer
+~~~~~~~~~~~~~~~~~~~~~~~~~
+
+A write-behind buffer for record changes.
+
+Calling upsert_zoho_module once per event costs at least one API call per change,
+often several for the same record within seconds. A BufferedWriter accepts changes,
+merges changes to the same record (same id, or same value of duplicate_key)
+and writes them in batches of up to 100 records from a background thread.
+A batch is written when it is full, when its oldest change is max_age seconds old,
+or on flush(). When max_pending changes are waiting, submit() blocks (back-pressure).
+
+Each submit() returns a concurrent.futures.Future which resolves to the record's entry
+in the API reply (with its status and details), or fails with RuntimeError.
+Use Future.add_done_callback for callbacks. A future can be cancelled until its batch
+is taken for writing; a change whose futures are all cancelled is not written.
+
+    with BufferedWriter(zoho_crm, 'Contacts', duplicate_key='Email') as writer:
+        for event in events:
+            writer.submit({'Email': event.email, 'Last_Name': event.last_name})
+
+Records with an id are updated; others go through the upsert API,
+matched on duplicate_key when it is given.
+"""
+
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, wait
+from typing import Dict, List, Optional
+
+from .zoho_crm_api import LOGGER, ZohoCRM
+
+MAX_BATCH_SIZE = 100  # records per call allowed by the API
+
+
+class _PendingChange:
+    __slots__ = ("record", "futures", "first_seen")
+
+    def __init__(self, record: dict):
+        self.record = dict(record)
+        self.futures = []  # type: List[Future]
+        self.first_seen = time.monotonic()
+
+
+class BufferedWriter:
+    """ Coalesces record changes and writes them in batches from a background thread."""
+
+    def __init__(
+            self,
+            zoho_crm: ZohoCRM,
+            module_name: str,
+            duplicate_key: str = None,
+            batch_size: int = MAX_BATCH_SIZE,
+            max_age: float = 5.0,
+            max_pending: int = 1000,
+    ):
+        if not 0 < batch_size <= MAX_BATCH_SIZE:
+            raise ValueError(
+                f"batch_size must be between 1 and {MAX_BATCH_SIZE}")
+        self.zoho_crm = zoho_crm
+        self.module_name = module_name
+        self.duplicate_key = duplicate_key
+        self.batch_size = batch_size
+        self.max_age = max_age
+        self.max_pending = max(max_pending, batch_size)
+        self._pending = OrderedDict()  # type: Dict[tuple, _PendingChange]
+        self._in_flight = []  # type: List[Future]
+        self._flush_requested = False
+        self._closed = False
+        self._unique = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(
+            target=self._run,
+            name=f"zoho-writer-{module_name}",
+            daemon=True)
+        self._thread.start()
+
+    def _key(self, record: dict) -> tuple:
+        if record.get("id"):
+            return ("id", record["id"])
+        if self.duplicate_key and record.get(self.duplicate_key) is not None:
+            return (self.duplicate_key, record[self.duplicate_key])
+        return ("new", next(self._unique))  # nothing to merge on
+
+    def submit(self, record: dict, timeout: float = None) -> Future:
+        """ Queue a change. Fields of a later change to the same record
+                override those of an earlier one which has not been written yet.
+                Blocks while the buffer is full; raises TimeoutError after timeout seconds."""
+        future = Future()
+        key = self._key(record)
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("BufferedWriter is closed")
+            if key not in self._pending:
+                if not self._condition.wait_for(
+                        lambda: len(self._pending) < self.max_pending or
+                        self._closed, timeout):
+                    raise TimeoutError(
+                        f"BufferedWriter for {self.module_name} is full")
+                if self._closed:
+                    raise RuntimeError("BufferedWriter is closed")
+            change = self._pending.get(key)
+            if change is None:
+                change = self._pending[key] = _PendingChange(record)
+            else:
+                change.record.update(record)
+            change.futures.append(future)
+            self._condition.notify_all()
+        return future
+
+    def flush(self, timeout: float = None) -> bool:
+        """ Write everything submitted so far and wait for the results.
+                Returns False if that took longer than timeout."""
+        with self._condition:
+            futures = [
+                f for change in self._pending.values() for f in change.futures
+            ] + self._in_flight
+            self._flush_requested = True
+            self._condition.notify_all()
+        _, not_done = wait(futures, timeout)
+        return not not_done
+
+    def close(self, timeout: float = None):
+        """ Write what is pending and stop the background thread."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join(timeout)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _next_batch(self) -> Optional[List[_PendingChange]]:
+        """ Wait until a batch is due; None when closed and empty."""
+        with self._condition:
+            while True:
+                if not self._pending:
+                    self._flush_requested = False
+                    if self._closed:
+                        return None
+                    self._condition.wait()
+                    continue
+                oldest = next(iter(self._pending.values()))
+                age = time.monotonic() - oldest.first_seen
+                if (len(self._pending) >= self.batch_size or
+                        self._flush_requested or self._closed or
+                        age >= self.max_age):
+                    break
+                self._condition.wait(self.max_age - age)
+            batch = []
+            while self._pending and len(batch) < self.batch_size:
+                change = self._pending.popitem(last=False)[1]
+                # from here on the futures can't be cancelled
+                change.futures = [
+                    f for f in change.futures if f.set_running_or_notify_cancel()
+                ]
+                if change.futures:
+                    batch.append(change)
+            self._in_flight = [f for change in batch for f in change.futures]
+            # there is room in the buffer again
+            self._condition.notify_all()
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                self._write_batch(batch)
+            except Exception as e:  # pylint: disable=broad-except
+                # fail this batch, but keep writing the next ones
+                LOGGER.exception(f"Batch write to {self.module_name} failed")
+                for change in batch:
+                    for future in change.futures:
+                        if not future.done():
+                            future.set_exception(e)
+            finally:
+                with self._condition:
+                    self._in_flight = []
+
+    def _write_batch(self, batch: List[_PendingChange]):
+        updates = [c for c in batch if c.record.get("id")]
+        upserts = [c for c in batch if not c.record.get("id")]
+        if updates:
+            self._write(updates, self.zoho_crm.update_zoho_module)
+        if upserts:
+            self._write(
+                upserts, lambda module_name, payload: self.zoho_crm.
+                bulk_upsert_zoho_module(
+                    module_name=module_name,
+                    payload=payload,
+                    duplicate_check_fields=[self.duplicate_key]
+                    if self.duplicate_key else None))
+
+    def _write(self, changes: List[_PendingChange], write_function):
+        try:
+            success, r_json = write_function(
+                module_name=self.module_name,
+                payload={"data": [c.record for c in changes]})
+            results = (r_json or {}).get("data") or []
+            if not success and len(results) != len(changes):
+                raise RuntimeError(
+                    f"Batch write to {self.module_name} failed: {r_json}")
+        except Exception as e:  # pylint: disable=broad-except
+            LOGGER.warning(f"Batch write to {self.module_name} failed: {e}")
+            for change in changes:
+                for future in change.futures:
+                    future.set_exception(e)
+            return
+        for change, result in itertools.zip_longest(changes, results):
+            if change is None:
+                break
+            for future in change.futures:
+                if result is not None and result.get("status") == "success":
+                    future.set_result(result)
+                else:
+                    future.set_exception(
+                        RuntimeError(
+                            f"Write to {self.module_name} failed: {result}"))
@@ -8,7 +8,8 @@ zoho_crm_connector
 This library is based on Zoho's python sdk but is simplified, more pragmatic and modernised.
 
 No database dependency is included.
-Short-lived access tokens are written to a text file with no alternative at present.
+Short-lived access tokens are written to a text file by default,
+see zoho_crm_connector.token_store for the alternatives.
 
 Multi-page requests are returned with yield (so they are generators).
 
@@ -23,45 +24,166 @@ Handy notes:
 Search criteria does not work across modules (where the json returns is a {name,id} object):
 you will need to enumerate a super-set of candidate results and search,
 or use get_related_records (see test case) but you will still need to enumerate.
-This is too complicated to put in the API.
+This is too complicated to put in the API, but zoho_crm_connector.join does the enumeration
+in one pass per module using hash indexes on the lookup ids.
 
 """
 
-import json
+import copy
+import functools
+import gzip
 import logging
+import threading
+import time
 import urllib.parse
+from collections import deque
+from concurrent.futures import (FIRST_COMPLETED, Future, ThreadPoolExecutor,
+                                wait)
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
 from pathlib import Path
 from datetime import datetime
-from typing import Optional, Tuple, List, Dict, Generator, Union
+from typing import Optional, Tuple, List, Dict, Generator, Union, Callable, Hashable
 import requests
 from requests.adapters import HTTPAdapter, Retry
 
+from .checkpoint import Checkpoint
+from .codec import JsonCodec, TransferStats, default_codec, timed_loads
+from .token_store import FileTokenStore
+
 LOGGER = logging.getLogger()
 
+# The deadline (time.monotonic()) of the ZohoCRM call running in this thread, if any.
+# The retry policy is shared by all threads, so it reads the deadline from here.
+_DEADLINE = threading.local()
+
+
+class DeadlineExceeded(RuntimeError):
+    """ A ZohoCRM call, including its retries and any token refresh,
+            did not finish within ZohoCRM.deadline seconds."""
+
+
+def _remaining_time() -> Optional[float]:
+    """ Seconds left before the deadline of this thread's call, or None if there is no deadline."""
+    deadline = getattr(_DEADLINE, "deadline", None)
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+class _DeadlineRetry(Retry):
+    """ A Retry which gives up once the deadline of the current call has passed,
+            or when its next backoff would sleep past the deadline.
+            Without a deadline, it is a plain Retry.
+            The deadline is checked in sleep, not increment: urllib3 drains the response of
+            a retried status before sleeping, so the connection goes back to the pool."""
+
+    def sleep(self, response=None):
+        remaining = _remaining_time()
+        if remaining is not None:
+            if remaining <= 0:
+                raise DeadlineExceeded("Deadline exceeded while retrying")
+            backoff = self.get_backoff_time()
+            if response is not None and self.respect_retry_after_header:
+                backoff = max(backoff, self.get_retry_after(response) or 0)
+            if backoff >= remaining:
+                raise DeadlineExceeded(
+                    f"Deadline exceeded: the next retry would be in {backoff:.1f}s"
+                )
+        super().sleep(response)
+
 
 def _requests_retry_session(
         retries=10,
         backoff_factor=2,
         status_forcelist=(500, 502, 503, 504, 429),
         session=None,
+        pool_maxsize=requests.adapters.DEFAULT_POOLSIZE,
 ) -> requests.Session:
     session = session or requests.Session()
     #  A set of integer HTTP status codes that we should force a retry on.
     #     A retry is initiated if the request method is in ``method_whitelist``
     #     and the response status code is in ``status_forcelist``.
-    retry = Retry(
+    retry = _DeadlineRetry(
         total=retries,
         read=retries,
         connect=retries,
         backoff_factor=backoff_factor,
         status_forcelist=status_forcelist,
     )
-    adapter = HTTPAdapter(max_retries=retry)
+    adapter = HTTPAdapter(max_retries=retry, pool_maxsize=pool_maxsize)
     session.mount("http://", adapter)
     session.mount("https://", adapter)
+    session.headers["Accept-Encoding"] = "gzip, deflate"
     return session
 
 
+class _SingleFlight:
+    """ Request coalescing: concurrent calls with the same key share one execution.
+            The first caller runs the function; callers arriving while it runs wait
+            for its result (or its exception). Followers get a deep copy of the result,
+            so no caller can change another caller's data."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}  # type: Dict[Hashable, Future]
+
+    def do(self, key: Hashable, function: Callable, timeout: float = None):
+        """ timeout only applies to callers waiting for another caller's call."""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            return copy.deepcopy(future.result(timeout=timeout))
+        try:
+            result = function()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+class _LatencyWindow:
+    """ The latencies of recent successful GETs, to decide when to hedge."""
+
+    def __init__(self, size: int = 200, min_samples: int = 20):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self.min_samples = min_samples
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        """ None until there are min_samples latencies."""
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < self.min_samples:
+            return None
+        index = min(len(samples) - 1, int(len(samples) * percentile / 100))
+        return samples[index]
+
+
+def _with_deadline(method):
+    """ Decorator for public ZohoCRM member functions:
+            the whole call must finish within ZohoCRM.deadline."""
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._deadline_scope():
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
 # # requests hook to get new token if expiry
 # def __hook(self, res, *args, **kwargs):
 #     if res.status_code == requests.codes.unauthorized:
@@ -95,19 +217,53 @@ class ZohoCRM:
             refresh_token: str,
             client_id: str,
             client_secret: str,
-            token_file_dir: Path,
+            token_file_dir: Path = None,
             base_url=None,
             default_zoho_user_name: str = None,
             default_zoho_user_id: str = None,
+            coalesce_requests: bool = True,
+            timeout: Union[float, Tuple[float, float]] = (10, 60),
+            deadline: float = None,
+            hedge_percentile: float = None,
+            json_codec: JsonCodec = None,
+            compress_requests_over: int = None,
+            token_store=None,
+            requests_session: requests.Session = None,
     ):
         """ Initialise a Zoho CRM connection by providing
                 authentication details including a refresh token.
                 Access tokens are obtained when needed. The base_url
                 defaults to the live API for US usage; another base_url
                 can be provided (for the sandbox API, for instance).
+
+                With coalesce_requests, identical GETs made at the same time from
+                several threads (get_record_by_id, get_related_records, get_users ...)
+                share one API call.
+
+                timeout is the connect and read timeout of each HTTP request
+                (a number for both, or a (connect, read) tuple).
+                deadline, in seconds, bounds each call of a public member function
+                (for generators, each page) including retries and token refresh;
+                DeadlineExceeded is raised when it runs out.
+                With hedge_percentile (such as 95), a GET which has not been answered after
+                that percentile of recent GET latencies is sent a second time,
+                and the first answer wins.
+
+                json_codec encodes request bodies and decodes responses
+                (by default orjson if installed, see zoho_crm_connector.codec).
+                Request bodies of at least compress_requests_over bytes are sent gzip-compressed;
+                leave it None unless the API endpoints you write to accept Content-Encoding: gzip.
+                transfer_stats counts compressed responses and bytes transferred.
+
+                The access token is kept in access_token.json in token_file_dir,
+                or in token_store if one is given (see zoho_crm_connector.token_store).
+                A requests_session can be passed to share its connection pool
+                (see zoho_crm_connector.manager).
                 """
         token_file_name = "access_token.json"
-        self.requests_session = _requests_retry_session()
+        if token_store is None and token_file_dir is None:
+            raise ValueError("Either token_file_dir or token_store is needed")
+        self.requests_session = requests_session or _requests_retry_session()
         self.refresh_token = refresh_token
         self.client_id = client_id
         self.client_secret = client_secret
@@ -115,7 +271,19 @@ class ZohoCRM:
         self.zoho_user_cache = None  # type: dict
         self.default_zoho_user_name = default_zoho_user_name
         self.default_zoho_user_id = default_zoho_user_id
-        self.token_file_path = token_file_dir / token_file_name
+        self.token_file_path = (token_file_dir / token_file_name
+                                if token_file_dir else None)
+        self.token_store = token_store or FileTokenStore(self.token_file_path)
+        self._single_flight = _SingleFlight() if coalesce_requests else None
+        self.timeout = timeout
+        self.deadline = deadline
+        self.hedge_percentile = hedge_percentile
+        self._latencies = _LatencyWindow()
+        self.json_codec = json_codec or default_codec()
+        self.compress_requests_over = compress_requests_over
+        self.transfer_stats = TransferStats()
+        self._hedge_executor = ThreadPoolExecutor(
+            thread_name_prefix="zoho-hedge") if hedge_percentile else None
         self.current_token = self._load_access_token()
 
     def _validate_response(self, r: requests.Response, retry: bool = False
@@ -127,7 +295,7 @@ class ZohoCRM:
                 so an exception is raised."""
         # https://www.zoho.com/crm/help/api/v2/#HTTP-Status-Codes
         if r.status_code == 200:
-            return (r, r.json())
+            return (r, self._decode(r))
         elif r.status_code == 201:
             return (r, None)  # insert succeeded
         elif r.status_code == 202:  # multiple insert succeeded
@@ -151,7 +319,8 @@ class ZohoCRM:
             orig_request = r.request
             orig_request.headers["Authorization"] = (
                 "Zoho-oauthtoken " + self.current_token["access_token"])
-            new_resp = self.requests_session.send(orig_request)
+            new_resp = self.requests_session.send(
+                orig_request, timeout=self._timeout())
 
             return self._validate_response(new_resp, retry=True)
         else:
@@ -161,12 +330,149 @@ class ZohoCRM:
                 f" attempted url was: {r.url},"
                 f" unquoted is: {urllib.parse.unquote(r.url)}")
 
+    @contextmanager
+    def _deadline_scope(self):
+        """ Start the deadline of a call, unless a call in this thread already has one
+                (so nested calls, such as the search in upsert_zoho_module, share it)."""
+        if self.deadline is None or getattr(_DEADLINE, "deadline",
+                                            None) is not None:
+            yield
+            return
+        _DEADLINE.deadline = time.monotonic() + self.deadline
+        try:
+            yield
+        finally:
+            _DEADLINE.deadline = None
+
+    def _timeout(self) -> Tuple[Optional[float], Optional[float]]:
+        """ The (connect, read) timeout, shortened to the time left before the deadline."""
+        if isinstance(self.timeout, tuple):
+            connect, read = self.timeout
+        else:
+            connect = read = self.timeout
+        remaining = _remaining_time()
+        if remaining is None:
+            return connect, read
+        if remaining <= 0:
+            raise DeadlineExceeded("Deadline exceeded before sending a request")
+        return (min(connect, remaining) if connect else remaining,
+                min(read, remaining) if read else remaining)
+
+    def _decode(self, r: requests.Response):
+        """ The json of a response, decoded with json_codec."""
+        decoded, seconds = timed_loads(self.json_codec, r.content)
+        self.transfer_stats.record(
+            r.headers.get("Content-Encoding"), r.headers.get("Content-Length"),
+            len(r.content), seconds)
+        return decoded
+
+    def _encode(self, payload, headers: dict) -> Tuple[bytes, dict]:
+        """ The request body for payload with json_codec,
+                gzip-compressed if it is at least compress_requests_over bytes."""
+        body = self.json_codec.dumps(payload)
+        headers = dict(headers or {})
+        headers["Content-Type"] = "application/json"
+        if (self.compress_requests_over is not None and
+                len(body) >= self.compress_requests_over):
+            body = gzip.compress(body)
+            headers["Content-Encoding"] = "gzip"
+        return body, headers
+
+    def _request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """ Send a request with requests_session, with timeouts.
+                A json keyword argument is encoded with json_codec.
+                GETs are hedged when hedge_percentile is set."""
+        if "json" in kwargs:
+            kwargs["data"], kwargs["headers"] = self._encode(
+                kwargs.pop("json"), kwargs.get("headers"))
+        if method == "get" and self._hedge_executor is not None:
+            hedge_after = self._latencies.percentile(self.hedge_percentile)
+            if hedge_after is not None:
+                return self._hedged_get(url, hedge_after, **kwargs)
+        start = time.monotonic()
+        r = getattr(self.requests_session, method)(
+            url=url, timeout=self._timeout(), **kwargs)
+        if method == "get" and r.ok:
+            self._latencies.add(time.monotonic() - start)
+        return r
+
+    def _hedged_get(self, url: str, hedge_after: float,
+                    **kwargs) -> requests.Response:
+        """ Send a GET; if it has not been answered after hedge_after seconds,
+                send it again and return whichever answer arrives first.
+                The slower request is left to finish in the background."""
+        deadline = getattr(_DEADLINE, "deadline", None)
+
+        def get():
+            _DEADLINE.deadline = deadline  # the deadline of the caller's thread
+            try:
+                start = time.monotonic()
+                r = self.requests_session.get(
+                    url=url, timeout=self._timeout(), **kwargs)
+                if r.ok:
+                    self._latencies.add(time.monotonic() - start)
+                return r
+            finally:
+                _DEADLINE.deadline = None
+
+        try:
+            first = self._hedge_executor.submit(get)
+        except RuntimeError:  # the executor was shut down: send a plain GET
+            return self.requests_session.get(
+                url=url, timeout=self._timeout(), **kwargs)
+        try:
+            return first.result(timeout=hedge_after)
+        except FutureTimeoutError:
+            pass
+        LOGGER.debug(f"Hedging GET {url} after {hedge_after:.3f}s")
+        pending = {first}
+        try:
+            pending.add(self._hedge_executor.submit(get))
+        except RuntimeError:
+            pass  # shut down meanwhile: wait for the first request alone
+        error = None
+        while pending:
+            done, pending = wait(
+                pending, timeout=_remaining_time(), return_when=FIRST_COMPLETED)
+            if not done:
+                raise DeadlineExceeded(f"Deadline exceeded waiting for {url}")
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def _get_json(self, url: str, headers: dict,
+                  params: dict = None) -> Union[None, Dict]:
+        """ GET and validate, coalescing identical concurrent requests.
+                The key leaves out the Authorization header: a token refresh by the
+                request in flight (see _validate_response) serves every waiting caller."""
+
+        def get():
+            r = self._request("get", url, headers=headers, params=params)
+            _, r_json = self._validate_response(r)
+            return r_json
+
+        if self._single_flight is None:
+            return get()
+        key = (url, tuple(sorted((params or {}).items())),
+               tuple(
+                   sorted((k, v)
+                          for k, v in headers.items()
+                          if k != "Authorization")))
+        try:
+            return self._single_flight.do(key, get, timeout=_remaining_time())
+        except FutureTimeoutError:
+            raise DeadlineExceeded(
+                f"Deadline exceeded waiting for a shared request to {url}")
+
     def yield_page_from_module(
             self,
             module_name: str,
             criteria: str = None,
             parameters: dict = None,
             modified_since: datetime = None,
+            checkpoint: Checkpoint = None,
     ) -> Generator[List[dict], None, None]:
         """ Yields a page of results. Usually called for you by a helper member function,
                     such as get_users.
@@ -178,32 +484,88 @@ class ZohoCRM:
                     (({apiname}:{starts_with|equals}:{value}) and ({apiname}:{starts_with|equals}:{value}))
                     You can search a maximum of 10 criteria (with same or different columns) with equals and
                     starts_with conditions as shown above.'
+                    For larger searches, see zoho_crm_connector.search.search_module
+
+                Pass a checkpoint to make a long pagination resumable,
+                see zoho_crm_connector.checkpoint.
                 """
-        page = 1
         if not criteria:
             url = self.base_url + module_name
         else:
             url = self.base_url + f"{module_name}/search"
 
+        headers = {}
+        parameters = dict(parameters or {})
+        if checkpoint:
+            checkpoint.bind(module_name, "records", criteria, parameters,
+                            modified_since)
+        if criteria:
+            parameters["criteria"] = criteria
+        if modified_since:
+            headers["If-Modified-Since"] = modified_since.isoformat()
+        yield from self._yield_pages(url, headers, parameters, checkpoint)
+
+    @_with_deadline
+    def get_module_page(
+            self,
+            module_name: str,
+            page: int = 1,
+            criteria: str = None,
+            parameters: dict = None,
+    ) -> Tuple[List[dict], dict]:
+        """ One page of a module (or of a search, with criteria) and its info,
+                such as {'per_page': 200, 'count': 200, 'page': 1, 'more_records': True}.
+                A page past the end is ([], {})."""
+        url = self.base_url + (f"{module_name}/search"
+                               if criteria else module_name)
         headers = {
             "Authorization":
                 "Zoho-oauthtoken " + self.current_token["access_token"]
         }
-        parameters = parameters or {}
+        parameters = dict(parameters or {}, page=page)
         if criteria:
             parameters["criteria"] = criteria
-        if modified_since:
-            headers["If-Modified-Since"] = modified_since.isoformat()
-        while True:
-            parameters["page"] = page
-            r = self.requests_session.get(
-                url=url,
-                headers=headers,
-                params=urllib.parse.urlencode(parameters),
-            )
+        r_json = self._get_json(url=url, headers=headers, params=parameters)
+        if not r_json:
+            return [], {}
+        return r_json.get("data", []), r_json.get("info", {})
 
-            _, r_json = self._validate_response(r)
+    def _yield_pages(
+            self,
+            url: str,
+            headers: dict,
+            parameters: dict,
+            checkpoint: Checkpoint = None,
+    ) -> Generator[List[dict], None, None]:
+        """ The pagination shared by the yield_ member functions.
+                A checkpoint is advanced after each page has been consumed,
+                and a resumed pagination starts from the page it recorded.
+                Page tokens (info.next_page_token) are followed when the API provides them.
+                The Authorization header is added to headers for each page, with the
+                current access token: a long pagination outlives the token it started with."""
+        page = checkpoint.page if checkpoint else 1
+        page_token = checkpoint.page_token if checkpoint else None
+        if checkpoint and checkpoint.done:
+            return None
+        while True:
+            if page_token:
+                parameters.pop("page", None)
+                parameters["page_token"] = page_token
+            else:
+                parameters["page"] = page
+            with self._deadline_scope():
+                r = self._request(
+                    "get",
+                    url,
+                    headers=dict(headers,
+                                 Authorization="Zoho-oauthtoken " +
+                                 self.current_token["access_token"]),
+                    params=urllib.parse.urlencode(parameters),
+                )
+                _, r_json = self._validate_response(r)
             if not r_json:
+                if checkpoint:
+                    checkpoint.advance(page, page_token, done=True)
                 return None
             if "data" in r_json:
                 yield r_json["data"]
@@ -211,13 +573,16 @@ class ZohoCRM:
                 raise RuntimeError(
                     "Did not receive the expected data format in the returned json when: "
                     f"url={url} parameters={parameters}")
-            if "info" in r_json:
-                if not r_json["info"]["more_records"]:
-                    break
-            else:
-                break
+            info = r_json.get("info")
+            more_records = bool(info and info["more_records"])
             page += 1
+            page_token = info.get("next_page_token") if info else None
+            if checkpoint:
+                checkpoint.advance(page, page_token, done=not more_records)
+            if not more_records:
+                break
 
+    @_with_deadline
     def get_users(self, user_type: str = None) -> dict:
         """
                 Get zoho users, filtering by a Zoho CRM user type.
@@ -230,10 +595,10 @@ class ZohoCRM:
                 "Authorization":
                     "Zoho-oauthtoken " + self.current_token["access_token"]
             }
-            r = self.requests_session.get(url=url, headers=headers)
-            _, self.zoho_user_cache = self._validate_response(r)
+            self.zoho_user_cache = self._get_json(url=url, headers=headers)
         return self.zoho_user_cache
 
+    @_with_deadline
     def finduser_by_name(self, full_name: str) -> Tuple[str, str]:
         """ Tries to reutn the user as a tuple(full_name,Zoho user id),
                     using the full full_name provided.
@@ -256,6 +621,20 @@ class ZohoCRM:
         LOGGER.info(f"User not found in zoho: {full_name}")
         return default_user_name, default_user_id
 
+    @_with_deadline
+    def get_module_fields(self, module_name: str) -> List[dict]:
+        """ Return the field metadata of a module (api_name, data_type and so on).
+                See https://www.zoho.com/crm/help/api/v2/#fields-meta-data"""
+        url = self.base_url + "settings/fields"
+        headers = {
+            "Authorization":
+                "Zoho-oauthtoken " + self.current_token["access_token"]
+        }
+        r_json = self._get_json(
+            url=url, headers=headers, params={"module": module_name})
+        return r_json["fields"] if r_json else []
+
+    @_with_deadline
     def get_record_by_id(self, module_name, record_id) -> dict:
         """ Call the get record endpoint with an id"""
 
@@ -264,15 +643,86 @@ class ZohoCRM:
             "Authorization":
                 "Zoho-oauthtoken " + self.current_token["access_token"]
         }
-        r = self.requests_session.get(url=url, headers=headers)
-        _, r_json = self._validate_response(r)
+        r_json = self._get_json(url=url, headers=headers)
         return r_json["data"][0]
 
+    def yield_records_by_ids(self, module_name: str, record_ids: List[str]
+                            ) -> Generator[List[dict], None, None]:
+        """ Yields pages of the records with the given ids, fetching up to 100 ids per call.
+                Records which no longer exist are left out."""
+        url = self.base_url + module_name
+        headers = {
+            "Authorization":
+                "Zoho-oauthtoken " + self.current_token["access_token"]
+        }
+        record_ids = list(record_ids)
+        for i in range(0, len(record_ids), 100):
+            with self._deadline_scope():
+                r_json = self._get_json(
+                    url=url,
+                    headers=headers,
+                    params={"ids": ",".join(record_ids[i:i + 100])})
+            if r_json and r_json.get("data"):
+                yield r_json["data"]
+
+    @_with_deadline
+    def enable_notifications(self, watch: List[Dict]) -> Tuple[bool, Dict]:
+        """ Subscribe notification channels with the watch API. Each entry of watch looks like
+                {'channel_id': '1000000068001', 'events': ['Deals.all'], 'channel_expiry': ...,
+                'token': ..., 'notify_url': ...}
+                Sending an existing channel_id again replaces its details (see update_notifications).
+                See https://www.zoho.com/crm/help/api/v2/#Notifications-API
+                """
+        url = self.base_url + "actions/watch"
+        headers = {
+            "Authorization":
+                "Zoho-oauthtoken " + self.current_token["access_token"]
+        }
+        r = self._request("post", url, headers=headers, json={"watch": watch})
+        if r.ok:
+            return True, self._decode(r)
+        else:
+            return False, self._decode(r)
+
+    @_with_deadline
+    def update_notifications(self, watch: List[Dict]) -> Tuple[bool, Dict]:
+        """ Update notification channels, for instance to extend their channel_expiry."""
+        url = self.base_url + "actions/watch"
+        headers = {
+            "Authorization":
+                "Zoho-oauthtoken " + self.current_token["access_token"]
+        }
+        r = self._request("put", url, headers=headers, json={"watch": watch})
+        if r.ok:
+            return True, self._decode(r)
+        else:
+            return False, self._decode(r)
+
+    @_with_deadline
+    def disable_notifications(self,
+                              channel_ids: List[str]) -> Tuple[bool, Dict]:
+        """ Unsubscribe notification channels."""
+        url = self.base_url + "actions/watch"
+        headers = {
+            "Authorization":
+                "Zoho-oauthtoken " + self.current_token["access_token"]
+        }
+        r = self._request(
+            "delete",
+            url,
+            headers=headers,
+            params={"channel_ids": ",".join(channel_ids)})
+        if r.ok:
+            return True, self._decode(r)
+        else:
+            return False, self._decode(r)
+
     def yield_deleted_records_from_module(
             self,
             module_name: str,
             deleted_type: str = "all",
             modified_since: datetime = None,
+            checkpoint: Checkpoint = None,
     ) -> Generator[List[dict], None, None]:
         """ Yields a page of deleted record results.
 
@@ -283,44 +733,24 @@ class ZohoCRM:
                                 'recycle': To get the list of deleted records from recycle bin.
                                 'permanent': To get the list of permanently deleted records.
                         modified_since (datetime.datetime): Return records deleted after this date.
+                        checkpoint (Checkpoint): Makes the pagination resumable,
+                                see zoho_crm_connector.checkpoint.
                 Returns:
                         A generator that yields pages of deleted records as a list of dictionaries.
 
                 """
-        page = 1
         url = self.base_url + f"{module_name}/deleted"
 
-        headers = {
-            "Authorization":
-                "Zoho-oauthtoken " + self.current_token["access_token"]
-        }
+        headers = {}
         parameters = {"type": deleted_type}
+        if checkpoint:
+            checkpoint.bind(module_name, "deleted", None, parameters,
+                            modified_since)
         if modified_since:
             headers["If-Modified-Since"] = modified_since.isoformat()
-        while True:
-            parameters["page"] = page
-            r = self.requests_session.get(
-                url=url,
-                headers=headers,
-                params=urllib.parse.urlencode(parameters),
-            )
-
-            _, r_json = self._validate_response(r)
-            if not r_json:
-                return None
-            if "data" in r_json:
-                yield r_json["data"]
-            else:
-                raise RuntimeError(
-                    "Did not receive the expected data format in the returned json when: "
-                    f"url={url} parameters={parameters}")
-            if "info" in r_json:
-                if not r_json["info"]["more_records"]:
-                    break
-            else:
-                break
-            page += 1
+        yield from self._yield_pages(url, headers, parameters, checkpoint)
 
+    @_with_deadline
     def delete_from_module(self, module_name: str,
                            record_id: str) -> Tuple[bool, dict]:
         """ deletes from a named Zoho CRM module"""
@@ -330,14 +760,15 @@ class ZohoCRM:
             "Authorization":
                 "Zoho-oauthtoken " + self.current_token["access_token"]
         }
-        r = self.requests_session.delete(
-            url=url, headers=headers, params={"ids": record_id})
+        r = self._request(
+            "delete", url, headers=headers, params={"ids": record_id})
 
         if r.ok and r.status_code == 200:
-            return True, r.json()
+            return True, self._decode(r)
         else:
-            return False, r.json()
+            return False, self._decode(r)
 
+    @_with_deadline
     def update_zoho_module(self, module_name: str,
                            payload: Dict[str, List[Dict]]) -> Tuple[bool, Dict]:
         """Update, modified from upsert
@@ -349,12 +780,43 @@ class ZohoCRM:
         }
         if "trigger" not in payload:
             payload["trigger"] = []
-        r = self.requests_session.put(url=url, headers=headers, json=payload)
+        r = self._request("put", url, headers=headers, json=payload)
         if r.ok:
-            return True, r.json()
+            return True, self._decode(r)
         else:
-            return False, r.json()
+            return False, self._decode(r)
+
+    @_with_deadline
+    def bulk_upsert_zoho_module(
+            self,
+            module_name: str,
+            payload: Dict[str, List[Dict]],
+            duplicate_check_fields: List[str] = None,
+    ) -> Tuple[bool, Dict]:
+        """Insert or update up to 100 records in one call with the upsert API.
+                Existing records are found by duplicate_check_fields
+                (when None, Zoho uses the module's system-defined duplicate check fields).
 
+                The json result has one entry in 'data' per record of the payload, in the same order,
+                with its own status and details.
+                See https://www.zoho.com/crm/help/api/v2/#upsert-records
+                """
+        url = self.base_url + f"{module_name}/upsert"
+        headers = {
+            "Authorization":
+                "Zoho-oauthtoken " + self.current_token["access_token"]
+        }
+        if "trigger" not in payload:
+            payload["trigger"] = []
+        if duplicate_check_fields:
+            payload["duplicate_check_fields"] = duplicate_check_fields
+        r = self._request("post", url, headers=headers, json=payload)
+        if r.ok:
+            return True, self._decode(r)
+        else:
+            return False, self._decode(r)
+
+    @_with_deadline
     def upsert_zoho_module(
             self,
             module_name: str,
@@ -399,21 +861,20 @@ class ZohoCRM:
         if "trigger" not in payload:
             payload["trigger"] = []
         if update_existing_record:
-            r = self.requests_session.put(
-                url=url, headers=headers, json=payload)
+            r = self._request("put", url, headers=headers, json=payload)
         else:
-            r = self.requests_session.post(
-                url=url, headers=headers, json=payload)
+            r = self._request("post", url, headers=headers, json=payload)
         if r.ok:
-            record_id = r.json()["data"][0]["details"]["id"]
+            record_id = self._decode(r)["data"][0]["details"]["id"]
             return (
                 True,
                 self.get_record_by_id(
                     module_name=module_name, record_id=record_id),
             )
         else:
-            return False, r.json()
+            return False, self._decode(r)
 
+    @_with_deadline
     def get_related_records(
             self,
             parent_module_name: str,
@@ -432,27 +893,25 @@ class ZohoCRM:
         }
         if modified_since:
             headers["If-Modified-Since"] = modified_since.isoformat()
-        r = self.requests_session.get(url=url, headers=headers)
-
-        _, r_json = self._validate_response(r)
+        r_json = self._get_json(url=url, headers=headers)
         return r_json["data"] if r_json else None
 
     def _load_access_token(self) -> dict:
         try:
-            with self.token_file_path.open() as data_file:
-                data_loaded = json.load(data_file)
-                # validate it
-                url = self.base_url + f"users?type='AllUsers'"
-                headers = {
-                    "Authorization":
-                        "Zoho-oauthtoken " + data_loaded["access_token"]
-                }
-                r = self.requests_session.get(url=url, headers=headers)
-                r = self.requests_session.post(url=url)
-                if r.status_code == 401:
-                    data_loaded = self._refresh_access_token()
-
-                return data_loaded
+            data_loaded = self.token_store.load()
+            if data_loaded is None:
+                return self._refresh_access_token()
+            # validate it
+            url = self.base_url + f"users?type='AllUsers'"
+            headers = {
+                "Authorization":
+                    "Zoho-oauthtoken " + data_loaded["access_token"]
+            }
+            r = self._request("get", url, headers=headers)
+            if r.status_code == 401:
+                data_loaded = self._refresh_access_token()
+
+            return data_loaded
         except (KeyError, FileNotFoundError, IOError):
             new_token = self._refresh_access_token()
             return new_token
@@ -464,14 +923,13 @@ class ZohoCRM:
         url = (f"https://accounts.zoho.com/oauth/v2/token?refresh_token="
                f"{self.refresh_token}&client_id={self.client_id}&"
                f"client_secret={self.client_secret}&grant_type=refresh_token")
-        r = requests.post(url=url)
+        r = self.requests_session.post(url=url, timeout=self._timeout())
         r_json = r.json()
         if r.status_code == 200 and "access_token" in r_json:
             new_token = r_json
             LOGGER.info(f"New token: {new_token}")
             self.current_token = new_token
-            with self.token_file_path.open("w") as outfile:
-                json.dump(new_token, outfile)
+            self.token_store.save(new_token)
             return new_token
         else:
             raise RuntimeError(f"API failure trying to get access token: "